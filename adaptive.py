@@ -0,0 +1,69 @@
+# Adaptive filter selection for autoscan. Rather than OCRing every image under all seven filters,
+# cheap image statistics rank the filters, the best candidate is OCRed first and the others are
+# only tried while the mean confidence stays below a threshold.
+
+import cv2
+
+DEFAULT_THRESHOLD = 0.6
+ALL_FILTERS = (0, 1, 2, 3, 4, 5, 6)
+
+# Statistic thresholds, on 0-255 grayscale images
+LOW_CONTRAST = 0.12    # grayscale standard deviation / 255
+BLURRY = 100.0         # variance of the Laplacian below this looks out of focus
+NOISY = 2500.0         # and above this looks grainy
+THIN_STROKES = 0.04    # fraction of ink pixels
+THICK_STROKES = 0.25
+
+def image_stats(gray):
+    # Contrast, sharpness (variance of the Laplacian) and stroke density (fraction of pixels on the
+    # ink side of an Otsu threshold, assuming the text is the minority) of a grayscale image
+    contrast = float(gray.std()) / 255
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    dark = 1 - cv2.countNonZero(binary) / binary.size
+    dark_text = dark <= 0.5
+    return {"contrast": contrast, "sharpness": sharpness, "stroke_density": dark if dark_text else 1 - dark,
+            "dark_text": dark_text}
+
+def rank_filters(stats):
+    # Filter numbers from most to least promising for an image with these statistics
+    scores = {filter_type: 0.0 for filter_type in ALL_FILTERS}
+    scores[0] = 1.0  # no filter is the safest guess when nothing stands out
+
+    if stats["sharpness"] < BLURRY or stats["contrast"] < LOW_CONTRAST:
+        scores[1] += 2.0  # sharpen out of focus or washed out text
+    if stats["sharpness"] > NOISY:
+        scores[2] += 2.0  # blur grain away
+        # and remove specks on the background, which are dark like the text when the text is dark:
+        # closing (4) fills in small dark spots, opening (3) removes small light ones
+        scores[4 if stats["dark_text"] else 3] += 1.5
+
+    # Erosion spreads dark pixels and dilation spreads light ones, so which one thickens the
+    # strokes depends on whether the text is darker than the background
+    thicken, thin = (5, 6) if stats["dark_text"] else (6, 5)
+    if stats["stroke_density"] < THIN_STROKES:
+        scores[thicken] += 1.5
+    elif stats["stroke_density"] > THICK_STROKES:
+        scores[thin] += 1.5
+
+    return sorted(ALL_FILTERS, key=lambda filter_type: (-scores[filter_type], filter_type))
+
+def mean_confidence(text_data):
+    if not text_data:
+        return 0.0
+    return sum(confidence for text, confidence, bbox in text_data) / len(text_data)
+
+def choose_filter(candidates, ocr, threshold=DEFAULT_THRESHOLD):
+    # OCR the candidates in order with ocr(filter_type) -> text_data until one reaches the threshold.
+    # Returns (best filter, its text_data, number of OCR passes).
+    best = None
+    passes = 0
+    for filter_type in candidates:
+        text_data = ocr(filter_type)
+        passes += 1
+        confidence = mean_confidence(text_data)
+        if best is None or confidence > best[0]:
+            best = (confidence, filter_type, text_data)
+        if confidence >= threshold:
+            break
+    return best[1], best[2], passes
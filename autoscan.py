@@ -1,63 +1,53 @@
 # Automatic text scanning of folder full of images. Useful for dataset. 
 
+import argparse
+import functools
+import multiprocessing
 import os
+import time
 import cv2
-import easyocr
-import numpy as np
-
-def apply_filter(image, filter_type):
-    if filter_type == 1:
-        # Sharpen
-        kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-        sharpened = cv2.filter2D(image, -1, kernel)
-        return sharpened
-    elif filter_type == 2:
-        # Gaussian Blur
-        blurred = cv2.GaussianBlur(image, (5,5), 0)
-        return blurred
-    elif filter_type == 3:
-        # Opening
-        kernel = np.ones((5,5),np.uint8)
-        opening = cv2.morphologyEx(image, cv2.MORPH_OPEN, kernel)
-        return opening
-    elif filter_type == 4:
-        # Closing
-        kernel = np.ones((5,5),np.uint8)
-        closing = cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernel)
-        return closing
-    elif filter_type == 5:
-        # Erosion
-        kernel = np.ones((5,5),np.uint8)
-        erosion = cv2.erode(image,kernel,iterations = 1)
-        return erosion
-    elif filter_type == 6:
-        # Dilation
-        kernel = np.ones((5,5),np.uint8)
-        dilation = cv2.dilate(image,kernel,iterations = 1)
-        return dilation
-    else:
+
+from adaptive import ALL_FILTERS, DEFAULT_THRESHOLD, choose_filter, image_stats, rank_filters
+from dataset import find_images, parse_shard, select_shard
+from dedup import DEFAULT_INDEX_PATH, HASH_BITS, MAX_DISTANCE, HashIndex, group_duplicates, scale_detections
+from filters import FILTER_TYPE_STAGES, apply_chain, parse_chain, to_gray
+from ocr_client import ServiceReader
+from ocr_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, OCRCache, make_key, reader_config
+from ocr_reader import get_reader, describe_setup, setup_span
+from scan_checkpoint import ScanCheckpoint
+from scan_output import BINARY_FORMATS, FORMATS, make_record, open_writer
+from scan_pipeline import BackgroundWriter, QueueStats, StageStats, prefetch
+from scan_trace import Tracer
+from tiling import DEFAULT_TILE_OVERLAP, DEFAULT_TILE_SIZE, needs_tiling, parse_tiling, read_text_tiled
+
+DEFAULT_QUEUE_DEPTH = 8
+
+def apply_filter(image, filter_type, timings=None):
+    # filter_type is a filter number (0-6) or a filters.py chain such as "blur,sharpen,dilation"
+    if isinstance(filter_type, int) and filter_type not in FILTER_TYPE_STAGES:
         return image  # No filter
+    return apply_chain(image, filter_type, timings)
+
+# Filters run by the sweep mode, in output order
+FILTER_TYPES = range(0, 7)
 
-def ocr_image(image_path, filter_type):
+def load_image(image_path):
     # Load the image using OpenCV
     image = cv2.imread(image_path)
 
     # Check if the image is loaded successfully
     if image is None:
         raise ValueError(f"Failed to load image from {image_path}")
+    return image
 
+def preprocess_image(image, filter_type, timings=None):
     # Apply selected filter
-    filtered_image = apply_filter(image, filter_type)
+    filtered_image = apply_filter(image, filter_type, timings)
 
     # Convert the filtered image to grayscale
-    gray = cv2.cvtColor(filtered_image, cv2.COLOR_BGR2GRAY)
-
-    # Initialize the OCR reader
-    reader = easyocr.Reader(['en'])
-
-    # Perform OCR on the grayscale image
-    result = reader.readtext(gray)
+    return to_gray(filtered_image, timings)
 
+def to_text_data(result):
     # Extract the text, confidence values, and bounding box coordinates
     text_data = []
     for detection in result:
@@ -68,35 +58,633 @@ def ocr_image(image_path, filter_type):
 
     return text_data
 
-def scan_images(folder_path, output_file, filter_type):
-    total_images = len([filename for filename in os.listdir(folder_path) if filename.endswith(('.jpg', '.jpeg', '.png'))])
-    scanned_images = 0
-
-    with open(output_file, 'w') as f:
-        # Iterate over all files in the folder
-        for filename in os.listdir(folder_path):
-            if filename.endswith(('.jpg', '.jpeg', '.png')):
-                scanned_images += 1
-                # Construct the full path to the image file
-                image_path = os.path.join(folder_path, filename)
-
-                try:
-                    # Perform OCR on the image after applying the selected filter
-                    text_data = ocr_image(image_path, filter_type)
-
-                    # Write the extracted text, confidence values, and bounding box coordinates to the output file
-                    f.write(f"File: {filename}\n")
-                    for text, confidence, bbox in text_data:
-                        #f.write(f"Text: {text}, Confidence: {confidence}, Bounding Box: {bbox}\n")
-                        f.write(f"Text: {text}, Confidence: {confidence}\n")
-                    f.write('\n')
-
-                    # Print scan progress to the terminal
-                    print(f"Scanning... ({scanned_images}/{total_images}) - Filter type: {filter_type}")
-                except ValueError as e:
-                    print(e)
+def read_text(reader, gray):
+    # Perform OCR on the grayscale image
+    return to_text_data(reader.readtext(gray))
+
+def read_text_traced(reader, gray, tracer, **args):
+    # read_text split into the detect and recognize calls readtext makes, so each stage is timed.
+    # args (file, filter) are attached to both spans.
+    start = time.perf_counter()
+    horizontal_list, free_list = reader.detect(gray)
+    detected = tracer.since("detect", start, **args)
+    result = reader.recognize(gray, horizontal_list[0], free_list[0])
+    tracer.since("recognize", detected, detections=len(result), **args)
+    return to_text_data(result)
+
+def read_text_batched(reader, grays, *, tracer=None, trace_args=None, tiling=None):
+    # Perform OCR on a list of grayscale images, returning text_data for each in input order.
+    # readtext_batched needs equally sized images, so the images are grouped by shape rather
+    # than padded or resized, which keeps every result identical to read_text.
+    # When tracing, trace_args holds the span args (file, filter) of each image.
+    # tiling=(tile_size, overlap) OCRs images larger than tile_size as overlapping tiles.
+    text_datas = [None] * len(grays)
+    groups = {}
+    for index, gray in enumerate(grays):
+        if needs_tiling(gray, tiling):
+            start = time.perf_counter()
+            text_datas[index] = read_text_tiled(lambda tiles: read_text_batched(reader, tiles), gray, tiling)
+            if tracer is not None:
+                tracer.since("ocr (tiled)", start, detections=len(text_datas[index]), **trace_args[index])
+            continue
+        groups.setdefault(gray.shape, []).append(index)
+
+    for indexes in groups.values():
+        if len(indexes) == 1:
+            index = indexes[0]
+            if tracer is not None and hasattr(reader, "detect"):
+                text_datas[index] = read_text_traced(reader, grays[index], tracer, **trace_args[index])
+            elif tracer is not None:
+                # The OCR service can't split detection from recognition
+                start = time.perf_counter()
+                text_datas[index] = read_text(reader, grays[index])
+                tracer.since("ocr", start, detections=len(text_datas[index]), **trace_args[index])
+            else:
+                text_datas[index] = read_text(reader, grays[index])
+            continue
+        start = time.perf_counter()
+        batch_results = reader.readtext_batched([grays[index] for index in indexes])
+        if tracer is not None:
+            # A batch can't be split per image, so each image gets an equal slice of it
+            share = (time.perf_counter() - start) / len(indexes)
+            for position, (index, result) in enumerate(zip(indexes, batch_results)):
+                tracer.add("ocr (batched)", start + position * share, share, detections=len(result), **trace_args[index])
+        for index, result in zip(indexes, batch_results):
+            text_datas[index] = to_text_data(result)
+
+    return text_datas
+
+def read_image_bytes(image_path):
+    # Read the raw image file, used to build the OCR cache key
+    try:
+        with open(image_path, 'rb') as image_file:
+            return image_file.read()
+    except OSError:
+        raise ValueError(f"Failed to load image from {image_path}")
+
+def ocr_config(languages=('en',), tiling=None):
+    # Reader config for the cache key; tiled results differ from whole image results
+    if tiling is None:
+        return reader_config(languages)
+    return reader_config(languages, tiling=list(tiling))
+
+def ocr_image(image_path, filter_type, reader=None, languages=('en',), gpu=True, cache=None, tracer=None, tiling=None):
+    # Unchanged images already in the cache cost one hash and one lookup
+    key = None
+    if cache is not None and not cache.bypass:
+        start = time.perf_counter()
+        key = make_key(read_image_bytes(image_path), filter_type, ocr_config(languages, tiling))
+        cached = cache.get(key)
+        if tracer is not None:
+            tracer.since("cache lookup", start, file=image_path, filter=filter_type)
+        if cached is not None:
+            return cached
+
+    if tracer is not None:
+        gray = traced_preprocess(image_path, filter_type, tracer)
+    else:
+        gray = preprocess_image(load_image(image_path), filter_type)
+
+    # Reuse the warm OCR reader instead of loading the models for every image
+    if reader is None:
+        reader = get_reader(languages, gpu)
+
+    if needs_tiling(gray, tiling) or tracer is not None:
+        text_data = read_text_batched(reader, [gray], tracer=tracer, trace_args=[{"file": image_path, "filter": filter_type}], tiling=tiling)[0]
+    else:
+        text_data = read_text(reader, gray)
+    if key is not None:
+        cache.put(key, text_data)
+    return text_data
+
+def traced_preprocess(image_path, filter_type, tracer):
+    # Load and preprocess one image, recording a span for the decode and for every filter stage
+    start = time.perf_counter()
+    image = load_image(image_path)
+    decoded = tracer.since("decode", start, file=image_path, width=image.shape[1], height=image.shape[0])
+    return trace_filters(image, filter_type, tracer, decoded, file=image_path)
+
+def trace_filters(image, filter_type, tracer, start, **args):
+    # Preprocess one decoded image, recording a span for every filter stage
+    stage_timings = {}
+    gray = preprocess_image(image, filter_type, stage_timings)
+    for name, seconds in stage_timings.items():
+        tracer.add(name, start, seconds, filter=filter_type, **args)
+        start += seconds
+    return gray
+
+def open_reader(languages=('en',), gpu=True, server=None):
+    # The warm reader of this process, or a client of the OCR service at the server URL, which
+    # already has its models loaded
+    if server is not None:
+        return ServiceReader(server)
+    return get_reader(languages, gpu)
+
+def describe_reader(languages=('en',), gpu=True, server=None):
+    if server is not None:
+        return f"Using the OCR service at {server}"
+    return describe_setup(languages, gpu)
+
+def trace_model_load(tracer, languages, gpu):
+    # Record the reader's model load, if this process loaded it
+    span = setup_span(languages, gpu)
+    if tracer is not None and span is not None:
+        tracer.add("model load", *span, languages=list(languages), gpu=gpu)
+
+# OCR reader, cache and tracer owned by this worker process (parallel scans only)
+_worker_reader = None
+_worker_cache = None
+_worker_tracer = None
+
+def chunk_filenames(filenames, batch_size):
+    # Split the filenames into consecutive batches
+    return [filenames[i:i + batch_size] for i in range(0, len(filenames), batch_size)]
+
+def prepare_image(folder_path, filename, filter_types, *, cache=None, config=None, tracer=None):
+    # Load one image and preprocess every filter variant that isn't already cached.
+    # Returns (filename, {filter_type: cached text_data}, [(filter_type, cache key, gray), ...], error message, timings, size)
+    # where timings holds the seconds spent loading (including cache lookups) and preprocessing, and
+    # size is (width, height), or None when every variant came from the cache and the image was never decoded.
+    image_path = os.path.join(folder_path, filename)
+    use_cache = cache is not None and not cache.bypass
+    found = {}
+    keys = {}
+    size = None
+    start = time.perf_counter()
+    try:
+        if use_cache:
+            # Look every variant up first; fully cached images are never decoded
+            data = read_image_bytes(image_path)
+            for variant in filter_types:
+                keys[variant] = make_key(data, variant, config)
+                cached = cache.get(keys[variant])
+                if cached is not None:
+                    found[variant] = cached
+            if tracer is not None:
+                tracer.since("cache lookup", start, file=filename, hits=len(found))
+        missing = [variant for variant in filter_types if variant not in found]
+        if missing:
+            decode_start = time.perf_counter()
+            image = load_image(image_path)
+            size = (image.shape[1], image.shape[0])
+            if tracer is not None:
+                tracer.since("decode", decode_start, file=filename, width=size[0], height=size[1])
+    except ValueError as e:
+        return filename, None, [], str(e), {}, None
+    loaded = time.perf_counter()
+    if tracer is not None:
+        pending = []
+        stage_start = loaded
+        for variant in missing:
+            pending.append((variant, keys.get(variant), trace_filters(image, variant, tracer, stage_start, file=filename)))
+            stage_start = time.perf_counter()
+    else:
+        pending = [(variant, keys.get(variant), preprocess_image(image, variant)) for variant in missing]
+    timings = {"load": loaded - start, "preprocess": time.perf_counter() - loaded, "ocr": 0.0}
+    return filename, found, pending, None, timings, size
+
+def ocr_prepared(reader, prepared, filter_types, *, cache=None, tracer=None, tiling=None):
+    # OCR the pending variants of a batch of prepare_image results together and map the results back
+    # to their filenames. Returns [(filename, [(filter_type, text_data), ...], error message, timings, size), ...]
+    # where timings also holds the image's share of the batch's OCR time.
+    grays = []
+    owners = []  # (index into prepared, filter_type, cache key) for each entry of grays
+    for index, (filename, found, pending, error, timings, size) in enumerate(prepared):
+        for variant, key, gray in pending:
+            grays.append(gray)
+            owners.append((index, variant, key))
+
+    trace_args = None
+    if tracer is not None:
+        trace_args = [{"file": prepared[index][0], "filter": variant} for index, variant, key in owners]
+    start = time.perf_counter()
+    text_datas = read_text_batched(reader, grays, tracer=tracer, trace_args=trace_args, tiling=tiling)
+    ocr_share = (time.perf_counter() - start) / len(grays) if grays else 0.0
+    for (index, variant, key), text_data in zip(owners, text_datas):
+        prepared[index][1][variant] = text_data
+        prepared[index][4]["ocr"] += ocr_share
+        if key is not None:
+            cache.put(key, text_data)
+
+    # Put each image's variants back in filter order
+    return [(filename, None if found is None else [(variant, found[variant]) for variant in filter_types], error, timings, size)
+            for filename, found, pending, error, timings, size in prepared]
+
+def adaptive_image(reader, folder_path, filename, adaptive, *, cache=None, config=None, tracer=None, tiling=None):
+    # OCR one image with the filters ranked by its statistics, stopping at the first whose mean confidence
+    # reaches the threshold. adaptive is (threshold, maximum filters to try).
+    # Returns (filename, [(chosen filter, text_data)], error message, timings, size) where timings also
+    # holds "passes", the number of OCR passes made (cached filters cost none).
+    threshold, max_tries = adaptive
+    image_path = os.path.join(folder_path, filename)
+    use_cache = cache is not None and not cache.bypass
+    start = time.perf_counter()
+    try:
+        data = read_image_bytes(image_path) if use_cache else None
+        image = load_image(image_path)
+    except ValueError as e:
+        return filename, None, str(e), {}, None
+    loaded = time.perf_counter()
+    if tracer is not None:
+        tracer.since("decode", start, file=filename, width=image.shape[1], height=image.shape[0])
+
+    stats = image_stats(to_gray(image))
+    candidates = rank_filters(stats)[:max_tries]
+    timings = {"load": loaded - start, "preprocess": time.perf_counter() - loaded, "ocr": 0.0, "passes": 0}
+    if tracer is not None:
+        tracer.since("adaptive stats", loaded, file=filename, candidates=candidates, **stats)
+
+    def ocr(variant):
+        key = None
+        if use_cache:
+            key = make_key(data, variant, config)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        stage_start = time.perf_counter()
+        if tracer is not None:
+            gray = trace_filters(image, variant, tracer, stage_start, file=filename)
+        else:
+            gray = preprocess_image(image, variant)
+        ocr_start = time.perf_counter()
+        text_data = read_text_batched(reader, [gray], tracer=tracer, trace_args=[{"file": filename, "filter": variant}], tiling=tiling)[0]
+        timings["preprocess"] += ocr_start - stage_start
+        timings["ocr"] += time.perf_counter() - ocr_start
+        timings["passes"] += 1
+        if key is not None:
+            cache.put(key, text_data)
+        return text_data
+
+    chosen, text_data, _ = choose_filter(candidates, ocr, threshold)
+    return filename, [(chosen, text_data)], None, timings, (image.shape[1], image.shape[0])
+
+def ocr_batch(reader, folder_path, filenames, filter_type, *, sweep=False, cache=None, languages=('en',), tracer=None, tiling=None,
+              adaptive=None):
+    # Load and preprocess a batch of images, OCR them together and map the results back to their filenames.
+    # Returns [(filename, [(filter_type, text_data), ...], error message, timings, size), ...]
+    # With adaptive=(threshold, max tries) each image's filter is chosen by adaptive_image instead.
+    filter_types = FILTER_TYPES if sweep else [filter_type]
+    config = ocr_config(languages, tiling)
+    if adaptive is not None:
+        # Each image's next OCR pass depends on its last one, so adaptive images aren't batched
+        return [adaptive_image(reader, folder_path, filename, adaptive, cache=cache, config=config, tracer=tracer, tiling=tiling)
+                for filename in filenames]
+    prepared = [prepare_image(folder_path, filename, filter_types, cache=cache, config=config, tracer=tracer) for filename in filenames]
+    return ocr_prepared(reader, prepared, filter_types, cache=cache, tracer=tracer, tiling=tiling)
+
+def init_worker(languages, gpu, threads, *, cache_settings=None, trace=False, server=None):
+    # Limit torch/OpenCV threads so the workers don't oversubscribe the cores, then load this worker's reader.
+    # cache_settings is (path, max_bytes) for the shared OCR cache, or None to run without one.
+    # trace=True records this worker's spans, which are sent back with each batch.
+    # server is the OCR service URL to send OCR to instead of loading a reader.
+    global _worker_reader, _worker_cache, _worker_tracer
+    if server is None:
+        import torch
+        torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+    if trace:
+        _worker_tracer = Tracer()
+    _worker_reader = open_reader(languages, gpu, server)
+    trace_model_load(_worker_tracer, languages, gpu)
+    if cache_settings is not None:
+        _worker_cache = OCRCache(*cache_settings)
+
+def worker_ocr_batch(job):
+    # Pool entry point: OCR one (folder_path, filenames, filter_type, options) batch with the worker's reader,
+    # where options holds the ocr_batch keyword arguments (sweep, languages, tiling, adaptive).
+    # Returns the batch results, the cache hits and misses it caused and its trace events.
+    folder_path, filenames, filter_type, options = job
+    events = []
+    if _worker_cache is None:
+        batch_results = ocr_batch(_worker_reader, folder_path, filenames, filter_type, tracer=_worker_tracer, **options)
+        if _worker_tracer is not None:
+            events = _worker_tracer.drain()
+        return batch_results, 0, 0, events
+    hits, misses = _worker_cache.hits, _worker_cache.misses
+    batch_results = ocr_batch(_worker_reader, folder_path, filenames, filter_type, cache=_worker_cache, tracer=_worker_tracer, **options)
+    if _worker_tracer is not None:
+        events = _worker_tracer.drain()
+    return batch_results, _worker_cache.hits - hits, _worker_cache.misses - misses, events
+
+def serial_results(folder_path, filenames, filter_type, *, languages=('en',), gpu=True, sweep=False, batch_size=1, cache=None, tracer=None,
+                   tiling=None, adaptive=None, server=None):
+    # Yield (filename, results, error, timings, size) for each image using the warm reader in this process
+    reader = open_reader(languages, gpu, server)
+    print(describe_reader(languages, gpu, server))
+    trace_model_load(tracer, languages, gpu)
+    for batch in chunk_filenames(filenames, batch_size):
+        yield from ocr_batch(reader, folder_path, batch, filter_type, sweep=sweep, cache=cache, languages=languages, tracer=tracer,
+                             tiling=tiling, adaptive=adaptive)
+
+def pipelined_results(folder_path, filenames, filter_type, stats, *, languages=('en',), gpu=True, sweep=False, batch_size=1, cache=None,
+                      prefetch_threads=1, queue_depth=DEFAULT_QUEUE_DEPTH, tracer=None, tiling=None, server=None):
+    # Like serial_results, but a thread pool decodes and filters up to queue_depth images ahead of OCR.
+    # stats is a dict that receives the StageStats and QueueStats of the decode and OCR stages.
+    filter_types = FILTER_TYPES if sweep else [filter_type]
+    config = ocr_config(languages, tiling)
+    reader = open_reader(languages, gpu, server)
+    print(describe_reader(languages, gpu, server))
+    trace_model_load(tracer, languages, gpu)
+
+    decode_stats = stats["decode"] = StageStats("decode+filter", prefetch_threads)
+    decode_queue = stats["decode_queue"] = QueueStats("prefetch", queue_depth)
+    ocr_stats = stats["ocr"] = StageStats("ocr")
+    prepared_images = prefetch(filenames, lambda filename: prepare_image(folder_path, filename, filter_types, cache=cache, config=config, tracer=tracer),
+                               prefetch_threads, queue_depth, decode_stats, decode_queue)
+
+    batch = []
+    for prepared in prepared_images:
+        batch.append(prepared)
+        if len(batch) >= batch_size:
+            start = time.perf_counter()
+            batch_results = ocr_prepared(reader, batch, filter_types, cache=cache, tracer=tracer, tiling=tiling)
+            ocr_stats.add(time.perf_counter() - start, len(batch))
+            yield from batch_results
+            batch = []
+    if batch:
+        start = time.perf_counter()
+        batch_results = ocr_prepared(reader, batch, filter_types, cache=cache, tracer=tracer, tiling=tiling)
+        ocr_stats.add(time.perf_counter() - start, len(batch))
+        yield from batch_results
+
+def parallel_results(folder_path, filenames, filter_type, workers, *, languages=('en',), gpu=True, sweep=False, batch_size=1, cache=None,
+                     tracer=None, tiling=None, adaptive=None, server=None):
+    # Yield (filename, results, error, timings, size) for each image from a process pool, in input order
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    options = {"sweep": sweep, "languages": tuple(languages), "tiling": tiling, "adaptive": adaptive}
+    jobs = [(folder_path, batch, filter_type, options) for batch in chunk_filenames(filenames, batch_size)]
+    use_cache = cache is not None and not cache.bypass
+    cache_settings = (cache.path, cache.max_bytes) if use_cache else None
+
+    # Spawn instead of fork so each worker starts with a clean torch/CUDA state
+    context = multiprocessing.get_context("spawn")
+    initializer = functools.partial(init_worker, tuple(languages), gpu, threads, cache_settings=cache_settings, trace=tracer is not None,
+                                    server=server)
+    with context.Pool(workers, initializer=initializer) as pool:
+        # imap streams results back as they finish while preserving the serial order
+        for batch_results, hits, misses, events in pool.imap(worker_ocr_batch, jobs, chunksize=1):
+            if tracer is not None:
+                tracer.extend(events)
+            if use_cache:
+                # Fold the workers' cache counters into the parent's cache
+                cache.hits += hits
+                cache.misses += misses
+            yield from batch_results
+
+def scan_images(folder_path, output_file, filter_type, *, languages=('en',), gpu=True, workers=1, sweep=False, batch_size=1, cache=None,
+                resume=False, output_format="text", prefetch_threads=0, queue_depth=DEFAULT_QUEUE_DEPTH, tracer=None,
+                recursive=False, manifest=None, shard=None, tiling=None, adaptive=None, server=None, dedup=None, hash_index=None):
+    # With sweep=True every filter in FILTER_TYPES is run and filter_type is ignored.
+    # batch_size > 1 groups that many images into each batched OCR call.
+    # cache is an optional OCRCache consulted before any image is decoded.
+    # resume=True continues an interrupted run from its checkpoint instead of starting over.
+    # output_format is one of scan_output.FORMATS.
+    # prefetch_threads > 0 runs decode/filter, OCR and writing as a pipeline joined by queues of queue_depth.
+    # tracer is an optional scan_trace.Tracer that records a span for every stage of every image.
+    # recursive=True includes subfolders, manifest is a dataset.py manifest file to reuse (or write),
+    # and shard=(i, N) scans only this machine's slice of the images.
+    # tiling=(tile_size, overlap) OCRs images larger than tile_size as overlapping tiles.
+    # adaptive=(threshold, max tries) picks each image's filter adaptively instead of using filter_type.
+    # server is the URL of a running ocr_service.py to send OCR to instead of loading the models here.
+    # dedup is a Hamming distance: images whose perceptual hash is within it of an earlier image copy that
+    # image's detections, scaled to their own size, instead of being OCRed. Hashes are kept in hash_index
+    # (a dedup.HashIndex).
+    filenames = select_shard(find_images(folder_path, recursive, manifest), shard)
+    total_images = len(filenames)
+    filter_label = "all (sweep)" if sweep else "adaptive" if adaptive is not None else filter_type
+    if shard is not None:
+        print(f"Shard {shard[0]}/{shard[1]}: {total_images} images")
+
+    settings = {"filter_type": filter_type, "sweep": sweep, "format": output_format}
+    if recursive:
+        settings["recursive"] = True
+    if manifest is not None:
+        settings["manifest"] = os.path.abspath(manifest)
+    if shard is not None:
+        settings["shard"] = list(shard)
+    if tiling is not None:
+        settings["tiling"] = list(tiling)
+    if adaptive is not None:
+        settings["adaptive"] = list(adaptive)
+    if dedup is not None:
+        settings["dedup"] = dedup
+    checkpoint = ScanCheckpoint(output_file, settings)
+    f = checkpoint.open(resume, binary=output_format in BINARY_FORMATS)
+    writer = open_writer(output_format, f)
+    unwritten = []  # images still buffered inside the writer
+    scanned_images = len(checkpoint.done)
+    if scanned_images:
+        print(f"Resuming... {scanned_images} images already scanned")
+        filenames = [filename for filename in filenames if filename not in checkpoint.done]
+
+    # Only the first image of each group of near-duplicates is OCRed
+    duplicates = {}
+    if dedup is not None:
+        duplicates, image_sizes = find_duplicates(folder_path, filenames, dedup, hash_index, tracer)
+        skipped = set(name for names in duplicates.values() for name in names)
+        filenames = [filename for filename in filenames if filename not in skipped]
+
+    pipeline_stats = {}
+    # The OCR settings shared by every way of producing results
+    options = {"languages": languages, "gpu": gpu, "sweep": sweep, "batch_size": batch_size, "cache": cache, "tracer": tracer,
+               "tiling": tiling, "server": server}
+    if workers > 1:
+        print(f"Scanning with {workers} worker processes")
+        results = parallel_results(folder_path, filenames, filter_type, workers, adaptive=adaptive, **options)
+    elif prefetch_threads > 0 and adaptive is None:
+        results = pipelined_results(folder_path, filenames, filter_type, pipeline_stats, prefetch_threads=prefetch_threads,
+                                    queue_depth=queue_depth, **options)
+    else:
+        # Load the OCR reader once for the whole run
+        results = serial_results(folder_path, filenames, filter_type, adaptive=adaptive, **options)
+
+    ocr_passes = 0
+    adaptive_images = 0
+    tag_filter = sweep or adaptive is not None
+
+    def write_result(result):
+        nonlocal scanned_images, unwritten, ocr_passes, adaptive_images
+        filename, image_results, error, timings, size = result
+        scanned_images += 1
+        if error is not None:
+            print(error)
+            # The duplicates share the image's fate; they are scanned again on resume
+            scanned_images += len(duplicates.get(filename, []))
+            return
+
+        # Write the extracted text, confidence values and bounding boxes to the output file,
+        # then the same detections for each of the image's duplicates, moved onto the duplicate's size
+        start = time.perf_counter()
+        for result_filter, text_data in image_results:
+            writer.write(make_record(filename, result_filter if tag_filter else None, text_data, timings, size))
+        for duplicate in duplicates.get(filename, []):
+            for result_filter, text_data in image_results:
+                writer.write(make_record(duplicate, result_filter if tag_filter else None,
+                                         scale_detections(text_data, image_sizes[filename], image_sizes[duplicate]),
+                                         size=image_sizes[duplicate], duplicate_of=filename))
+        if tracer is not None:
+            tracer.since("write", start, file=filename)
+
+        # Only checkpoint images once the writer has put them in the file
+        unwritten.append(filename)
+        unwritten.extend(duplicates.get(filename, []))
+        if writer.buffered == 0:
+            for done_filename in unwritten:
+                checkpoint.mark_done(done_filename)
+            unwritten = []
+
+        # Print scan progress to the terminal
+        if adaptive is not None:
+            ocr_passes += timings["passes"]
+            adaptive_images += 1
+            print(f"Scanning... ({scanned_images}/{total_images}) - Filter type: adaptive, chose {image_results[0][0]} "
+                  f"after {timings['passes']} OCR passes")
+        else:
+            print(f"Scanning... ({scanned_images}/{total_images}) - Filter type: {filter_label}")
+        for duplicate in duplicates.get(filename, []):
+            scanned_images += 1
+            print(f"Scanning... ({scanned_images}/{total_images}) - {duplicate} is a duplicate of {filename}, skipped OCR")
+
+    # In pipeline mode the output is written on its own thread
+    output_stage = None
+    if prefetch_threads > 0 and workers == 1 and adaptive is None:
+        pipeline_stats["write"] = StageStats("write")
+        pipeline_stats["write_queue"] = QueueStats("write", queue_depth)
+        output_stage = BackgroundWriter(write_result, queue_depth, pipeline_stats["write"], pipeline_stats["write_queue"])
+
+    # Closing the checkpoint fsyncs it, so even a Ctrl-C keeps the finished images
+    start = time.perf_counter()
+    try:
+        for result in results:
+            if output_stage is not None:
+                output_stage.put(result)
+            else:
+                write_result(result)
+    finally:
+        try:
+            if output_stage is not None:
+                output_stage.close()
+        finally:
+            writer.close()
+            for done_filename in unwritten:
+                checkpoint.mark_done(done_filename)
+            checkpoint.close()
+
+    if pipeline_stats:
+        report_pipeline(pipeline_stats, time.perf_counter() - start)
+    if duplicates:
+        skipped_images = sum(len(names) for names in duplicates.values())
+        print(f"Duplicates: {skipped_images} images matched {len(duplicates)} earlier images and skipped OCR")
+    if adaptive_images:
+        exhaustive = adaptive_images * len(ALL_FILTERS)
+        print(f"Adaptive filter selection: {ocr_passes} OCR passes for {adaptive_images} images instead of {exhaustive} "
+              f"({exhaustive - ocr_passes} saved)")
+
+def find_duplicates(folder_path, filenames, max_distance, hash_index=None, tracer=None):
+    # Hash the images and group near-duplicates, in scan order, so the first image of each group is
+    # its representative. Returns ({representative: [duplicate filenames, ...]}, {filename: (width, height)}).
+    start = time.perf_counter()
+    index = hash_index if hash_index is not None else HashIndex()
+    try:
+        image_hashes = index.hashes([os.path.join(folder_path, filename) for filename in filenames])
+    finally:
+        if hash_index is None:
+            index.close()
+    hashed = [(filename, image_hashes[os.path.join(folder_path, filename)]) for filename in filenames
+              if os.path.join(folder_path, filename) in image_hashes]
+    duplicates = group_duplicates([(filename, image_hash) for filename, (image_hash, size) in hashed], max_distance)
+    if tracer is not None:
+        tracer.since("dedup", start, images=len(filenames), hashed=index.computed, duplicates=sum(map(len, duplicates.values())))
+    print(f"Hashed {index.computed} images ({index.reused} from the index)")
+    return duplicates, {filename: size for filename, (image_hash, size) in hashed}
+
+def report_pipeline(stats, wall_seconds):
+    # Per-stage throughput and queue occupancy; the stage with the lowest capacity limits the run
+    print()
+    print(f"Pipeline stats ({wall_seconds:.2f}s):")
+    for name in ("decode", "ocr", "write"):
+        if name in stats:
+            print("  " + stats[name].report(wall_seconds))
+    for name in ("decode_queue", "write_queue"):
+        if name in stats:
+            print("  " + stats[name].report())
+
+def parse_args():
+    # Optional command line flags; the folder, filter and output file are still prompted for
+    parser = argparse.ArgumentParser(description="Automatic text scanning of a folder full of images.")
+    parser.add_argument("--workers", type=int, default=1, help="number of OCR worker processes (default: 1)")
+    parser.add_argument("--chain", help="filter chain instead of a filter number, e.g. blur,sharpen,dilation (stage names from filters.py)")
+    parser.add_argument("--sweep", action="store_true", help="run every filter (0-6) on each image into one tagged output file")
+    parser.add_argument("--adaptive", action="store_true", help="pick each image's filter from its contrast, sharpness and stroke density, trying more filters only while confidence is low")
+    parser.add_argument("--adaptive-threshold", type=float, default=DEFAULT_THRESHOLD, help=f"mean confidence that ends the search for a better filter (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--adaptive-tries", type=int, default=len(ALL_FILTERS), help=f"most filters to OCR per image (default: {len(ALL_FILTERS)})")
+    parser.add_argument("--batch-size", type=int, default=1, help="images per batched OCR call (default: 1, unbatched)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"OCR result cache file (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="maximum cache size in MB before least recently used results are evicted")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the OCR result cache")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted scan from its .ckpt checkpoint file")
+    parser.add_argument("--format", choices=FORMATS, default="text", help="output file format (default: text)")
+    parser.add_argument("--prefetch", type=int, default=0, help="threads decoding and filtering images ahead of OCR, with output written on its own thread (default: 0, off)")
+    parser.add_argument("--queue-depth", type=int, default=DEFAULT_QUEUE_DEPTH, help=f"images buffered between pipeline stages (default: {DEFAULT_QUEUE_DEPTH})")
+    parser.add_argument("--recursive", action="store_true", help="also scan images in subfolders")
+    parser.add_argument("--manifest", help="image list file: reused if it exists, otherwise written after listing the folder")
+    parser.add_argument("--shard", help="scan only slice i of N (0-based), e.g. 0/4, for splitting a folder across machines")
+    parser.add_argument("--tile-size", type=int, help=f"OCR images larger than this many pixels as overlapping tiles of this size, e.g. {DEFAULT_TILE_SIZE} (default: off)")
+    parser.add_argument("--tile-overlap", type=int, default=DEFAULT_TILE_OVERLAP, help=f"pixels shared by neighbouring tiles (default: {DEFAULT_TILE_OVERLAP})")
+    parser.add_argument("--dedup", type=int, metavar="DISTANCE", help=f"OCR only the first of each group of images whose perceptual hashes differ in at most DISTANCE of {HASH_BITS} bits (0 for exact duplicates, default: off)")
+    parser.add_argument("--hash-index", default=DEFAULT_INDEX_PATH, help=f"perceptual hash index reused across runs (default: {DEFAULT_INDEX_PATH})")
+    parser.add_argument("--timings", action="store_true", help="print p50/p95 timings of every stage (decode, filters, detect, recognize, write) at the end")
+    parser.add_argument("--trace", help="also write every stage of every image to this Chrome trace JSON file")
+    parser.add_argument("--server", help="send OCR to a running ocr_service.py at this URL, e.g. http://127.0.0.1:8765, instead of loading the models")
+    parser.add_argument("--cpu", action="store_true", help="run the OCR reader on the CPU")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    if args.workers < 1:
+        print("Invalid worker count. Please provide 1 or more workers.")
+        return
+    if args.batch_size < 1:
+        print("Invalid batch size. Please provide a batch size of 1 or more.")
+        return
+    if args.prefetch < 0 or args.queue_depth < 1:
+        print("Invalid pipeline settings. Please provide 0 or more prefetch threads and a queue depth of 1 or more.")
+        return
+    adaptive = None
+    if args.adaptive:
+        if args.sweep or args.chain:
+            print("Invalid options. --adaptive picks the filter itself, so it can't be combined with --sweep or --chain.")
+            return
+        if not 0 <= args.adaptive_threshold <= 1 or args.adaptive_tries < 1:
+            print("Invalid adaptive settings. Please provide a threshold between 0 and 1 and 1 or more tries.")
+            return
+        adaptive = (args.adaptive_threshold, args.adaptive_tries)
+    if args.dedup is not None and not 0 <= args.dedup <= MAX_DISTANCE:
+        print(f"Invalid duplicate distance. Please provide a distance between 0 and {MAX_DISTANCE}.")
+        return
+    tiling = None
+    if args.tile_size is not None:
+        try:
+            tiling = parse_tiling(args.tile_size, args.tile_overlap)
+        except ValueError as e:
+            print(e)
+            return
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            print(e)
+            return
+
+    if args.server:
+        # Fail before prompting if the service isn't running
+        try:
+            print(f"OCR service: {ServiceReader(args.server).health()['reader']}")
+        except ConnectionError as e:
+            print(e)
+            return
+
     # Prompt the user to enter the folder path containing images
     folder_path = input("Enter the folder path containing images: ")
 
@@ -105,24 +693,60 @@ def main():
         print("Invalid folder path. Please provide a valid path.")
         return
 
-    # Prompt the user to select a filter
-    print("Select a filter (enter 0 for no filter, 1-6 for different filters):")
-    print("0 - No filter, 1 - Sharpen, 2 - Gaussian Blur, 3 - Opening, 4 - Closing, 5 - Erosion, 6 - Dilation")
-    filter_type = input("Enter the number corresponding to the filter: ")
+    if args.sweep or args.adaptive:
+        # Sweep and adaptive modes pick the filters themselves, so there is nothing to select
+        filter_type = None
+    elif args.chain:
+        # A chain tuned in the GUI replaces the filter number
+        try:
+            parse_chain(args.chain)
+        except ValueError as e:
+            print(e)
+            return
+        filter_type = args.chain
+    else:
+        # Prompt the user to select a filter
+        print("Select a filter (enter 0 for no filter, 1-6 for different filters):")
+        print("0 - No filter, 1 - Sharpen, 2 - Gaussian Blur, 3 - Opening, 4 - Closing, 5 - Erosion, 6 - Dilation")
+        filter_type = input("Enter the number corresponding to the filter: ")
 
-    # Convert filter_type to an integer
-    filter_type = int(filter_type)
+        # Convert filter_type to an integer
+        filter_type = int(filter_type)
 
-    # Validate the filter type
-    if filter_type not in range(0, 7):
-        print("Invalid filter type. Please enter a number between 0 and 6.")
-        return
+        # Validate the filter type
+        if filter_type not in range(0, 7):
+            print("Invalid filter type. Please enter a number between 0 and 6.")
+            return
 
     # Prompt the user to enter the output file name
     output_file = input("Enter the output file name (including extension): ")
 
     # Scan images in the folder for text after applying the selected filter (if any) and save to a text file
-    scan_images(folder_path, output_file, filter_type)
+    cache = OCRCache(args.cache, args.cache_size * 1024 * 1024, bypass=args.no_cache)
+    tracer = Tracer() if args.timings or args.trace else None
+    hash_index = HashIndex(args.hash_index) if args.dedup is not None else None
+    try:
+        scan_images(folder_path, output_file, filter_type, gpu=not args.cpu, workers=args.workers, sweep=args.sweep,
+                    batch_size=args.batch_size, cache=cache, resume=args.resume,
+                    output_format=args.format, prefetch_threads=args.prefetch, queue_depth=args.queue_depth, tracer=tracer,
+                    recursive=args.recursive, manifest=args.manifest, shard=shard, tiling=tiling, adaptive=adaptive, server=args.server,
+                    dedup=args.dedup, hash_index=hash_index)
+    except (ValueError, ConnectionError) as e:
+        # Raised when the checkpoint doesn't match the selected filter settings, or the OCR service went away or failed
+        print(e)
+        return
+    finally:
+        cache.close()
+        if hash_index is not None:
+            hash_index.close()
+    print(cache.stats())
+
+    if tracer is not None:
+        print()
+        print(tracer.summary())
+        if args.trace:
+            tracer.write(args.trace)
+            print(f"Trace written to {args.trace}")
 
     print()
     print("Success!")
@@ -1,19 +1,100 @@
-# Program to take average of condifence values from output csv files
+# Program to take average of condifence values from output files
 
-import csv
-import re
+import argparse
+import math
 
-# Function to extract confidence values from the CSV file
+from scan_output import iter_records
+
+# Confidence values fall in [0, 1], so a fixed histogram gives percentiles to within 1/HISTOGRAM_BINS
+HISTOGRAM_BINS = 1000
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+# Running count, mean, standard deviation, min/max and approximate percentiles in constant memory
+class RunningStats:
+    def __init__(self, histogram=True):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.histogram = [0] * HISTOGRAM_BINS if histogram else None
+
+    def add(self, value):
+        # Welford's update keeps the mean and variance numerically stable in one pass
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if self.histogram is not None:
+            self.histogram[min(max(int(value * HISTOGRAM_BINS), 0), HISTOGRAM_BINS - 1)] += 1
+
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else None
+
+    def percentile(self, p):
+        # Approximate percentile, interpolated inside the histogram bin it falls in
+        if not self.count or self.histogram is None:
+            return None
+        target = p / 100 * self.count
+        seen = 0
+        for index, bin_count in enumerate(self.histogram):
+            if bin_count and seen + bin_count >= target:
+                fraction = (target - seen) / bin_count
+                value = (index + fraction) / HISTOGRAM_BINS
+                return min(max(value, self.min), self.max)
+            seen += bin_count
+        return self.max
+
+    def summary(self, percentiles=()):
+        if not self.count:
+            return "no confidence values"
+        parts = [f"count={self.count}", f"mean={self.mean:.4f}", f"std={self.std():.4f}",
+                 f"min={self.min:.4f}", f"max={self.max:.4f}"]
+        for p in percentiles:
+            parts.append(f"p{p:g}={self.percentile(p):.4f}")
+        return ", ".join(parts)
+
+# Function to summarize one or more output files in a single pass over each.
+# Returns ({"all": stats, "file:<path>": stats, "filter:<n>": stats}, image_count). When on_image is
+# given it is called with (path, filename, stats) as each image finishes; records of one image are
+# contiguous in autoscan output, so per-image stats never need to be held in memory.
+def summarize(paths, on_image=None):
+    groups = {"all": RunningStats()}
+    image_count = 0
+    for path in paths:
+        file_stats = groups.setdefault(f"file:{path}", RunningStats())
+        current_image = None
+        image_stats = None
+        for record in iter_records(path):
+            if record["file"] != current_image:
+                if current_image is not None and on_image is not None:
+                    on_image(path, current_image, image_stats)
+                current_image = record["file"]
+                image_stats = RunningStats(histogram=False)
+                image_count += 1
+
+            filter_stats = None
+            if record["filter"] is not None:
+                filter_stats = groups.setdefault(f"filter:{record['filter']}", RunningStats())
+            for detection in record["detections"]:
+                confidence = detection["confidence"]
+                groups["all"].add(confidence)
+                file_stats.add(confidence)
+                image_stats.add(confidence)
+                if filter_stats is not None:
+                    filter_stats.add(confidence)
+        if current_image is not None and on_image is not None:
+            on_image(path, current_image, image_stats)
+    return groups, image_count
+
+# Function to extract confidence values from an output file (autoscan text/jsonl/columnar or GUI CSV)
 def extract_confidence_values(csv_filename):
     confidence_values = []
-    with open(csv_filename, newline='') as csvfile:
-        reader = csv.reader(csvfile)
-        for row in reader:
-            for item in row:
-                # Use regular expression to find confidence values
-                match = re.search(r"Confidence: ([0-9.]+)", item)
-                if match:
-                    confidence_values.append(float(match.group(1)))
+    for record in iter_records(csv_filename):
+        for detection in record["detections"]:
+            confidence_values.append(detection["confidence"])
     return confidence_values
 
 # Function to calculate the average confidence value
@@ -23,22 +104,46 @@ def calculate_average_confidence(confidence_values):
     else:
         return None
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Confidence statistics for autoscan and GUI output files.")
+    parser.add_argument("files", nargs="*", help="output files to summarize (prompted for when omitted)")
+    parser.add_argument("--by-image", action="store_true", help="also print statistics for every image")
+    parser.add_argument("--percentiles", default=",".join(str(p) for p in DEFAULT_PERCENTILES),
+                        help="comma separated percentiles to report (default: 50,90,99)")
+    return parser.parse_args()
+
 # Main function
 def main():
+    args = parse_args()
+    percentiles = [float(p) for p in args.percentiles.split(",") if p]
+
     # Prompt the user for the CSV filename
-    csv_filename = input("Enter the name of the CSV file (including extension): ")
+    paths = args.files
+    if not paths:
+        paths = [input("Enter the name of the CSV file (including extension): ")]
 
-    # Extract confidence values from the CSV file
-    confidence_values = extract_confidence_values(csv_filename)
+    def print_image(path, filename, stats):
+        print(f"Image {filename} ({path}): {stats.summary()}")
 
-    # Calculate the average confidence value
-    average_confidence = calculate_average_confidence(confidence_values)
+    groups, image_count = summarize(paths, print_image if args.by_image else None)
 
     # Output the average confidence value to the terminal
-    if average_confidence is not None:
-        print(f"Average confidence value: {average_confidence}")
+    overall = groups["all"]
+    if overall.count:
+        print(f"Average confidence value: {overall.mean}")
     else:
         print("No confidence values found in the CSV file.")
+        return
+
+    print(f"All ({image_count} images): {overall.summary(percentiles)}")
+    if len(paths) > 1:
+        for path in paths:
+            print(f"File {path}: {groups[f'file:{path}'].summary(percentiles)}")
+
+    # Sweep files also get statistics per filter
+    filters = sorted((key[len("filter:"):] for key in groups if key.startswith("filter:")), key=lambda f: (not f.isdigit(), f.zfill(8)))
+    for filter_type in filters:
+        print(f"Filter {filter_type}: {groups[f'filter:{filter_type}'].summary(percentiles)}")
 
 # Call the main function
 if __name__ == "__main__":
@@ -0,0 +1,236 @@
+# Benchmark for the OCR path: reader startup, images/sec for every filter, per image latency, an
+# end-to-end scan_images run and peak memory, all on the CPU. It runs over the images in input/ plus
+# synthetic images at larger sizes, writes the results to a JSON file, and can compare them with a
+# saved baseline to flag regressions.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from autoscan import FILTER_TYPES, apply_filter, load_image, ocr_image, scan_images
+from dataset import list_images
+from ocr_reader import clear_readers, get_reader, setup_time
+from scan_trace import Tracer, percentile
+
+DEFAULT_INPUT = "input"
+DEFAULT_OUTPUT = "benchmark.json"
+DEFAULT_SYNTHETIC_SIZES = "1920x1080,3840x2160"
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 10.0  # percent
+
+SYNTHETIC_LINES = ["ROAD CLOSED", "DETOUR AHEAD", "Benchmark 0123456789", "the quick brown fox jumps over the lazy dog"]
+
+def synthetic_image(width, height):
+    # A deterministic white page of black text lines scaled to the image size
+    image = np.full((height, width, 3), 255, np.uint8)
+    scale = width / 640
+    line_height = int(40 * scale)
+    y = line_height
+    index = 0
+    while y < height - line_height // 2:
+        text = SYNTHETIC_LINES[index % len(SYNTHETIC_LINES)]
+        cv2.putText(image, text, (int(20 * scale), y), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), max(1, int(2 * scale)))
+        y += line_height
+        index += 1
+    return image
+
+def parse_sizes(sizes):
+    # "1920x1080,3840x2160" -> [(1920, 1080), (3840, 2160)]
+    parsed = []
+    for size in sizes.split(","):
+        if size.strip():
+            width, height = size.lower().split("x")
+            parsed.append((int(width), int(height)))
+    return parsed
+
+def build_dataset(input_folder, sizes, work_folder):
+    # Returns {group name: folder of images}. The input images are one group and every synthetic size
+    # is another, so a regression on large images isn't hidden by the small ones.
+    groups = {}
+    if os.path.isdir(input_folder) and list_images(input_folder):
+        groups["input"] = input_folder
+    for width, height in sizes:
+        folder = os.path.join(work_folder, f"synthetic_{width}x{height}")
+        os.makedirs(folder)
+        cv2.imwrite(os.path.join(folder, "synthetic.png"), synthetic_image(width, height))
+        groups[f"synthetic_{width}x{height}"] = folder
+    return groups
+
+def peak_rss_mb():
+    # Peak resident memory of this process, or None where the resource module is unavailable (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def metric(value, unit, better):
+    return {"value": value, "unit": unit, "better": better}
+
+def bench_filters(reader, group, paths, repeat, metrics):
+    # Preprocessing rate, OCR rate and per image latency of every filter, taking the median of repeat runs
+    images = [load_image(path) for path in paths]
+    for filter_type in FILTER_TYPES:
+        # Warm up once so lazy initialization isn't counted
+        ocr_image(paths[0], filter_type, reader)
+
+        preprocess_rates = []
+        ocr_rates = []
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for image in images:
+                apply_filter(image, filter_type)
+            preprocess_rates.append(len(images) / (time.perf_counter() - start))
+
+            start = time.perf_counter()
+            for path in paths:
+                image_start = time.perf_counter()
+                ocr_image(path, filter_type, reader)
+                latencies.append(time.perf_counter() - image_start)
+            ocr_rates.append(len(paths) / (time.perf_counter() - start))
+
+        latencies.sort()
+        prefix = f"{group}/filter{filter_type}"
+        metrics[f"{prefix}/preprocess_images_per_s"] = metric(statistics.median(preprocess_rates), "images/s", "higher")
+        metrics[f"{prefix}/ocr_images_per_s"] = metric(statistics.median(ocr_rates), "images/s", "higher")
+        metrics[f"{prefix}/latency_p50_ms"] = metric(percentile(latencies, 50) * 1000, "ms", "lower")
+        metrics[f"{prefix}/latency_p95_ms"] = metric(percentile(latencies, 95) * 1000, "ms", "lower")
+        print(f"{prefix}: {metrics[f'{prefix}/ocr_images_per_s']['value']:.2f} images/s, "
+              f"p50 {metrics[f'{prefix}/latency_p50_ms']['value']:.1f} ms")
+
+def bench_scan(group, folder, work_folder, metrics):
+    # End-to-end scan_images run (load, filter, OCR, write) of the folder with filter 0 and no cache
+    output_file = os.path.join(work_folder, f"{group}.txt")
+    tracer = Tracer()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        scan_images(folder, output_file, 0, gpu=False, tracer=tracer)
+    seconds = time.perf_counter() - start
+
+    image_totals = sorted(tracer.stage_durations().get("image total", [0.0]))
+    prefix = f"{group}/scan"
+    metrics[f"{prefix}/images_per_s"] = metric(len(list_images(folder)) / seconds, "images/s", "higher")
+    metrics[f"{prefix}/latency_p50_ms"] = metric(percentile(image_totals, 50) * 1000, "ms", "lower")
+    metrics[f"{prefix}/latency_p95_ms"] = metric(percentile(image_totals, 95) * 1000, "ms", "lower")
+    print(f"{prefix}: {metrics[f'{prefix}/images_per_s']['value']:.2f} images/s end to end")
+
+def run_benchmark(input_folder, sizes, repeat):
+    # Returns the results document: environment, settings and {metric name: {"value", "unit", "better"}}
+    metrics = {}
+    work_folder = tempfile.mkdtemp(prefix="ocr_benchmark_")
+    try:
+        # Drop any reader loaded earlier in the process, so the startup measured is a full model load
+        clear_readers()
+        reader = get_reader(('en',), gpu=False)
+        metrics["reader_startup_s"] = metric(setup_time(('en',), gpu=False), "s", "lower")
+        print(f"reader_startup_s: {metrics['reader_startup_s']['value']:.2f}")
+
+        groups = build_dataset(input_folder, sizes, work_folder)
+        for group, folder in groups.items():
+            paths = [os.path.join(folder, filename) for filename in list_images(folder)]
+            bench_filters(reader, group, paths, repeat, metrics)
+            bench_scan(group, folder, work_folder, metrics)
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    rss = peak_rss_mb()
+    if rss is not None:
+        metrics["peak_rss_mb"] = metric(rss, "MB", "lower")
+        print(f"peak_rss_mb: {rss:.1f}")
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "settings": {"input": input_folder, "synthetic_sizes": [list(size) for size in sizes], "repeat": repeat, "device": "cpu"},
+        "metrics": metrics,
+    }
+
+def compare(baseline, results, tolerance):
+    # Print every metric next to its baseline and return the names of those that got worse by more than tolerance percent
+    regressions = []
+    for name, current in results["metrics"].items():
+        previous = baseline["metrics"].get(name)
+        if previous is None or not previous["value"]:
+            print(f"{name}: {current['value']:.2f} {current['unit']} (new)")
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"] * 100
+        worse = change < -tolerance if current["better"] == "higher" else change > tolerance
+        flag = "  REGRESSION" if worse else ""
+        print(f"{name}: {previous['value']:.2f} -> {current['value']:.2f} {current['unit']} ({change:+.1f}%){flag}")
+        if worse:
+            regressions.append(name)
+    for name in baseline["metrics"]:
+        if name not in results["metrics"]:
+            print(f"{name}: missing from this run")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark OCR throughput, latency and memory on the CPU.")
+    parser.add_argument("--input", default=DEFAULT_INPUT, help=f"folder of real images to benchmark (default: {DEFAULT_INPUT})")
+    parser.add_argument("--synthetic-sizes", default=DEFAULT_SYNTHETIC_SIZES,
+                        help=f"comma separated WIDTHxHEIGHT synthetic images, empty for none (default: {DEFAULT_SYNTHETIC_SIZES})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"timed runs per filter, the median is reported (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"results JSON file (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--compare", help="baseline results JSON file to compare this run against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"percent a metric may get worse before it is flagged as a regression (default: {DEFAULT_TOLERANCE:g})")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.repeat < 1:
+        print("Invalid repeat count. Please provide 1 or more.")
+        return 2
+    try:
+        sizes = parse_sizes(args.synthetic_sizes)
+    except ValueError:
+        print("Invalid synthetic sizes. Please use WIDTHxHEIGHT, e.g. 1920x1080,3840x2160.")
+        return 2
+
+    # Read the baseline first so a bad path fails before the benchmark runs
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError):
+            print("Baseline not found or not a benchmark results file. Please provide a valid file path.")
+            return 2
+
+    results = run_benchmark(args.input, sizes, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        print()
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:g}%: {', '.join(regressions)}")
+            return 1
+        print(f"No regressions beyond {args.tolerance:g}%.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
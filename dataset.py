@@ -0,0 +1,139 @@
+# Dataset discovery for autoscan. Folders are walked with os.scandir in a single pass (optionally
+# recursively), image extensions are matched case-insensitively, and the listing can be saved as a
+# manifest so later runs skip the walk. --shard i/N gives each of N machines a disjoint, deterministic
+# slice of the images; merge_outputs combines their output files back into one.
+
+import argparse
+import heapq
+import json
+import os
+import zlib
+
+from scan_output import BINARY_FORMATS, FORMATS, detect_format, iter_records, open_writer
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def path_key(relative_path):
+    # Sort key that matches the walk order: a folder's contents sort where the folder's name does
+    return relative_path.split("/")
+
+def iter_images(folder_path, recursive=False, prefix=""):
+    # Yield the image paths in the folder relative to it, using "/" separators, in a fixed order:
+    # entries sorted by name, with each subfolder's images where the subfolder sorts
+    with os.scandir(folder_path) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        relative_path = prefix + entry.name
+        if recursive and entry.is_dir(follow_symlinks=False):
+            yield from iter_images(entry.path, recursive, relative_path + "/")
+        elif entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+            yield relative_path
+
+def list_images(folder_path, recursive=False):
+    # List the image files in the folder once, in a fixed order shared by serial and parallel runs
+    return list(iter_images(folder_path, recursive))
+
+def write_manifest(manifest_path, folder_path, filenames, recursive=False):
+    # One JSON header line describing the walk, then one relative image path per line
+    with open(manifest_path, 'w') as f:
+        f.write(json.dumps({"folder": os.path.abspath(folder_path), "recursive": recursive, "count": len(filenames)}) + "\n")
+        for filename in filenames:
+            f.write(filename + "\n")
+
+def read_manifest(manifest_path):
+    # Returns (header, filenames)
+    with open(manifest_path, 'r') as f:
+        header = json.loads(f.readline())
+        filenames = [line.rstrip("\n") for line in f if line.strip()]
+    if len(filenames) != header.get("count", len(filenames)):
+        raise ValueError(f"Manifest {manifest_path} is incomplete: expected {header['count']} images, found {len(filenames)}")
+    return header, filenames
+
+def find_images(folder_path, recursive=False, manifest_path=None):
+    # List the images, reusing the manifest if it exists and writing it if it doesn't.
+    # A manifest of another folder, or of a walk with a different recursive setting, raises ValueError.
+    if manifest_path is not None and os.path.exists(manifest_path):
+        header, filenames = read_manifest(manifest_path)
+        if os.path.abspath(header.get("folder", "")) != os.path.abspath(folder_path) or header.get("recursive", False) != recursive:
+            raise ValueError(f"Manifest {manifest_path} lists {'recursive ' if header.get('recursive') else ''}images of "
+                             f"{header.get('folder')}, not of this scan. Please use a different manifest file.")
+        print(f"Using manifest {manifest_path} ({len(filenames)} images from {header['folder']})")
+        return filenames
+    filenames = list_images(folder_path, recursive)
+    if manifest_path is not None:
+        write_manifest(manifest_path, folder_path, filenames, recursive)
+        print(f"Manifest written to {manifest_path} ({len(filenames)} images)")
+    return filenames
+
+def parse_shard(shard):
+    # "i/N" -> (i, N) with 0 <= i < N
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{shard}'. Please use i/N, e.g. 0/4.")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{shard}'. i must be between 0 and N-1.")
+    return index, count
+
+def in_shard(filename, shard):
+    # Shards are picked by a stable hash of the path, so every node agrees on them even if it
+    # discovered the folder itself rather than sharing a manifest
+    index, count = shard
+    return zlib.crc32(filename.encode('utf-8')) % count == index
+
+def select_shard(filenames, shard):
+    if shard is None:
+        return filenames
+    return [filename for filename in filenames if in_shard(filename, shard)]
+
+def merge_outputs(paths, output_file, output_format=None):
+    # Merge the output files of a sharded run into one, in walk order. Each shard is already in walk
+    # order, so the files are streamed through a k-way merge instead of being loaded.
+    # output_format defaults to the format of the first file.
+    if output_format is None:
+        output_format = detect_format(paths[0])
+        if output_format not in FORMATS:
+            output_format = "text"
+    merged = heapq.merge(*(iter_records(path) for path in paths), key=lambda record: path_key(record["file"]))
+    count = 0
+    with open(output_file, 'wb' if output_format in BINARY_FORMATS else 'w') as f:
+        writer = open_writer(output_format, f)
+        for record in merged:
+            writer.write(record)
+            count += 1
+        writer.close()
+    return count
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build image manifests and merge sharded autoscan outputs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    manifest_parser = subparsers.add_parser("manifest", help="walk a folder once and save its image list")
+    manifest_parser.add_argument("folder", help="folder containing images")
+    manifest_parser.add_argument("manifest", help="manifest file to write")
+    manifest_parser.add_argument("--recursive", action="store_true", help="include images in subfolders")
+    merge_parser = subparsers.add_parser("merge", help="merge the output files of a sharded autoscan run")
+    merge_parser.add_argument("output", help="merged output file")
+    merge_parser.add_argument("shards", nargs="+", help="shard output files")
+    merge_parser.add_argument("--format", choices=FORMATS, help="merged output format (default: that of the first shard)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.command == "manifest":
+        if not os.path.isdir(args.folder):
+            print("Invalid folder path. Please provide a valid path.")
+            return
+        filenames = list_images(args.folder, args.recursive)
+        write_manifest(args.manifest, args.folder, filenames, args.recursive)
+        print(f"Manifest written to {args.manifest} ({len(filenames)} images)")
+    else:
+        try:
+            count = merge_outputs(args.shards, args.output, args.format)
+        except FileNotFoundError:
+            print("File not found. Please provide valid file paths.")
+            return
+        print(f"Merged {count} records into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
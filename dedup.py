@@ -0,0 +1,150 @@
+# Near-duplicate detection for autoscan. Every image gets a 256 bit difference hash (dHash) of its
+# grayscale pixels, kept in a SQLite index that persists across runs so unchanged files are
+# never hashed twice. Images whose hashes are within a Hamming distance of an earlier image are
+# grouped with it; only the first image of each group is OCRed and the others copy its detections.
+
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+from PIL import Image
+
+DEFAULT_INDEX_PATH = "image_hashes.sqlite"
+# A 16x16 hash rather than the usual 8x8, so text pages that only share a layout stay apart
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE * HASH_SIZE
+MAX_DISTANCE = 64
+# Bumped whenever dhash changes, so indexes of older hashes are rebuilt
+HASH_VERSION = 2
+EXIF_ORIENTATION = 0x0112
+
+def dhash(image_path):
+    # Difference hash: shrink to 17x16 grayscale and record whether each pixel is brighter than its
+    # right neighbour. Robust to rescaling, recompression and small brightness changes.
+    # The image is decoded in full: OpenCV's reduced decodes subsample PNGs without averaging, which
+    # aliases text differently at every scale and put 2x downscaled copies 20-50 bits away.
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"Failed to load image from {image_path}")
+    small = cv2.resize(image, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    value = 0
+    for row in small:
+        for left, right in zip(row[:-1], row[1:]):
+            value = (value << 1) | int(left > right)
+    return value
+
+def image_size(image_path):
+    # (width, height) of the image as OpenCV decodes it, from the file header alone. Like cv2.imread,
+    # EXIF orientations that turn the image by 90 degrees swap the sides.
+    with Image.open(image_path) as image:
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+    return width, height
+
+def scale_detections(text_data, from_size, to_size):
+    # Move [(text, confidence, bbox), ...] detections of an image of from_size onto a copy of it
+    # resized to to_size
+    scale_x = to_size[0] / from_size[0]
+    scale_y = to_size[1] / from_size[1]
+    return [(text, confidence, [[x * scale_x, y * scale_y] for x, y in bbox] if bbox is not None else None)
+            for text, confidence, bbox in text_data]
+
+def hamming(hash1, hash2):
+    return bin(hash1 ^ hash2).count("1")
+
+class HashIndex:
+    # Persistent path -> (dHash, image size) index; a file is rehashed when its size or modification time changes
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.computed = 0
+        self.reused = 0
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # Indexes written by an older dhash (or before image sizes were stored) are rebuilt
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != HASH_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS hashes")
+            self.connection.execute(f"PRAGMA user_version = {HASH_VERSION}")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, hash TEXT NOT NULL, "
+            "width INTEGER NOT NULL, height INTEGER NOT NULL)")
+
+    def hashes(self, image_paths, threads=None):
+        # Returns {image path: (hash, (width, height))} for every path that could be read. New and
+        # changed files are hashed on a thread pool (OpenCV releases the GIL while decoding).
+        found = {}
+        missing = []
+        for image_path in image_paths:
+            try:
+                stat = os.stat(image_path)
+            except OSError:
+                continue
+            key = os.path.abspath(image_path)
+            row = self.connection.execute("SELECT size, mtime_ns, hash, width, height FROM hashes WHERE path = ?", (key,)).fetchone()
+            if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+                found[image_path] = (int(row[2], 16), (row[3], row[4]))
+                self.reused += 1
+            else:
+                missing.append((image_path, key, stat))
+
+        def try_hash(image_path):
+            try:
+                return dhash(image_path), image_size(image_path)
+            except (ValueError, OSError):
+                return None
+
+        with ThreadPoolExecutor(max_workers=threads or os.cpu_count() or 1) as executor:
+            computed = list(executor.map(try_hash, [image_path for image_path, key, stat in missing]))
+        rows = []
+        for (image_path, key, stat), value in zip(missing, computed):
+            if value is None:
+                continue
+            found[image_path] = value
+            image_hash, (width, height) = value
+            rows.append((key, stat.st_size, stat.st_mtime_ns, f"{image_hash:0{HASH_BITS // 4}x}", width, height))
+        self.connection.execute("BEGIN")
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, hash, width, height) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.connection.execute("COMMIT")
+        self.computed += len(rows)
+        return found
+
+    def close(self):
+        self.connection.close()
+
+def band_values(value, band_bits):
+    # The hash split into consecutive bit ranges
+    return [(value >> low) & ((1 << (high - low)) - 1) for low, high in zip(band_bits[:-1], band_bits[1:])]
+
+def group_duplicates(items, max_distance=0):
+    # Group (name, hash) items, in order, with the nearest earlier representative within max_distance bits.
+    # Returns {representative name: [duplicate names, ...]} for groups with duplicates.
+    # Representatives are found through max_distance + 1 bands of the hash: two hashes within
+    # max_distance bits of each other must agree exactly on at least one band, so only
+    # representatives sharing a band value are compared.
+    bands = max_distance + 1
+    band_bits = [HASH_BITS * band // bands for band in range(bands + 1)]
+    band_tables = [{} for _ in range(bands)]
+    representatives = []
+    groups = {}
+    for name, value in items:
+        values = band_values(value, band_bits)
+        candidates = set()
+        for table, band_value in zip(band_tables, values):
+            candidates.update(table.get(band_value, ()))
+
+        best = None
+        for index in sorted(candidates):
+            distance = hamming(value, representatives[index][1])
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, representatives[index][0])
+        if best is not None:
+            groups.setdefault(best[1], []).append(name)
+            continue
+
+        representatives.append((name, value))
+        for table, band_value in zip(band_tables, values):
+            table.setdefault(band_value, []).append(len(representatives) - 1)
+    return groups
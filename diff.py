@@ -1,40 +1,223 @@
 # Program to diff the two file outputs, seeing which file scanned the text more accurately: before or after filter applied
 
+from difflib import SequenceMatcher
+
+from scan_output import detect_format, iter_records
+
+# Minimum text similarity or bbox overlap for two detections to count as the same text
+MATCH_THRESHOLD = 0.5
+# How far apart, in records, the two files may list an image and still have it paired
+PAIRING_WINDOW = 2000
+
+def text_similarity(text1, text2):
+    if text1 == text2:
+        return 1.0
+    return SequenceMatcher(None, text1, text2).ratio()
+
+def bbox_overlap(bbox1, bbox2):
+    # Intersection over union of the axis aligned boxes around two bboxes, 0 when either is missing
+    if not bbox1 or not bbox2:
+        return 0.0
+    left1, right1 = min(x for x, y in bbox1), max(x for x, y in bbox1)
+    top1, bottom1 = min(y for x, y in bbox1), max(y for x, y in bbox1)
+    left2, right2 = min(x for x, y in bbox2), max(x for x, y in bbox2)
+    top2, bottom2 = min(y for x, y in bbox2), max(y for x, y in bbox2)
+    width = min(right1, right2) - max(left1, left2)
+    height = min(bottom1, bottom2) - max(top1, top2)
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (right1 - left1) * (bottom1 - top1) + (right2 - left2) * (bottom2 - top2) - intersection
+    return intersection / union if union > 0 else 0.0
+
+def align_detections(detections1, detections2):
+    # Pair up the detections of one image by text similarity or bbox overlap, best pairs first.
+    # Returns (matched pairs, unmatched from 1, unmatched from 2), each in original order.
+    candidates = []
+    for i, detection1 in enumerate(detections1):
+        for j, detection2 in enumerate(detections2):
+            score = max(text_similarity(detection1["text"], detection2["text"]),
+                        bbox_overlap(detection1["bbox"], detection2["bbox"]))
+            if score >= MATCH_THRESHOLD:
+                candidates.append((score, i, j))
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[1], candidate[2]))
+
+    pairs = {}
+    used2 = set()
+    for score, i, j in candidates:
+        if i not in pairs and j not in used2:
+            pairs[i] = j
+            used2.add(j)
+
+    matched = [(detections1[i], detections2[pairs[i]]) for i in sorted(pairs)]
+    missing = [detection for i, detection in enumerate(detections1) if i not in pairs]
+    added = [detection for j, detection in enumerate(detections2) if j not in used2]
+    return matched, missing, added
+
+def record_label(key):
+    filename, filter_type = key
+    label = filename if filename is not None else "(single image)"
+    if filter_type is not None:
+        label += f" [filter {filter_type}]"
+    return label
+
+class DiffSummary:
+    def __init__(self, label1, label2):
+        self.label1 = label1
+        self.label2 = label2
+        self.compared = 0
+        self.identical = 0
+        self.only1 = 0
+        self.only2 = 0
+        self.matched = 0
+        self.confidence_delta = 0.0
+
+    def compare(self, key, record1, record2):
+        # Print the differences between two records of the same image
+        self.compared += 1
+        matched, missing, added = align_detections(record1["detections"], record2["detections"])
+        lines = []
+        for detection1, detection2 in matched:
+            delta = detection2["confidence"] - detection1["confidence"]
+            self.matched += 1
+            self.confidence_delta += delta
+            if detection1["text"] != detection2["text"] or delta != 0:
+                lines.append(f"  ~ \"{detection1['text']}\" -> \"{detection2['text']}\", "
+                             f"Confidence: {detection1['confidence']:.4f} -> {detection2['confidence']:.4f} ({delta:+.4f})")
+        for detection in missing:
+            lines.append(f"  - \"{detection['text']}\" ({detection['confidence']:.4f}) only in {self.label1}")
+        for detection in added:
+            lines.append(f"  + \"{detection['text']}\" ({detection['confidence']:.4f}) only in {self.label2}")
+
+        if not lines:
+            self.identical += 1
+            return
+        print(f"Difference found in {record_label(key)}:")
+        for line in lines:
+            print(line)
+        print()
+
+    def only_in(self, key, label):
+        if label == self.label1:
+            self.only1 += 1
+        else:
+            self.only2 += 1
+        print(f"{record_label(key)} only in {label}")
+        print()
+
+    def report(self):
+        print(f"Images compared: {self.compared}, identical: {self.identical}, changed: {self.compared - self.identical}")
+        print(f"Only in {self.label1}: {self.only1}, only in {self.label2}: {self.only2}")
+        if self.matched:
+            print(f"Mean confidence change of matched text: {self.confidence_delta / self.matched:+.4f}")
+        print("Comparison completed.")
+
+class JoinSide:
+    # One record stream of merge_join, with its records still waiting for a partner
+    def __init__(self, records, key, label):
+        self.iterator = iter(records)
+        self.key = key
+        self.label = label
+        self.position = 0
+        self.paired = -1      # position of the furthest record paired so far
+        self.pending = {}     # key -> (position, record), in position order
+        self.exhausted = False
+
+def merge_join(records1, records2, summary, key1, key2):
+    # Walk both record streams in step, pairing records with the same key in any order. Unpaired
+    # records wait in the pending dicts; outputs of the same folder list images in (nearly) the same
+    # order, so a partner usually turns up within a few records. A pending record is reported as only
+    # in its file once a record of its file more than PAIRING_WINDOW after it has been paired, once
+    # PAIRING_WINDOW newer records are waiting, or once the other file ends, so memory stays bounded
+    # however many images only one file has and whatever order the files are in.
+    side1 = JoinSide(records1, key1, summary.label1)
+    side2 = JoinSide(records2, key2, summary.label2)
+
+    def expire(side):
+        while side.pending:
+            key, (position, record) = next(iter(side.pending.items()))
+            if side.paired - position <= PAIRING_WINDOW:
+                break
+            del side.pending[key]
+            summary.only_in(key, side.label)
+
+    def read(side, other):
+        record = next(side.iterator, None)
+        if record is None:
+            side.exhausted = True
+            # Nothing left to pair the other file's waiting records with
+            for key in other.pending:
+                summary.only_in(key, other.label)
+            other.pending.clear()
+            return
+        key = side.key(record)
+        position = side.position
+        side.position += 1
+        if key in other.pending:
+            other_position, other_record = other.pending.pop(key)
+            if side is side1:
+                summary.compare(key, record, other_record)
+            else:
+                summary.compare(key, other_record, record)
+            side.paired = max(side.paired, position)
+            other.paired = max(other.paired, other_position)
+            expire(side)
+            expire(other)
+        elif other.exhausted:
+            summary.only_in(key, side.label)
+        else:
+            if key in side.pending:
+                # A repeated image in the same file can't be paired, report the earlier copy
+                del side.pending[key]
+                summary.only_in(key, side.label)
+            side.pending[key] = (position, record)
+            if len(side.pending) > PAIRING_WINDOW:
+                # Files in very different orders: give up on the record that has waited longest
+                oldest = next(iter(side.pending))
+                del side.pending[oldest]
+                summary.only_in(oldest, side.label)
+
+    # Read from the side with fewer records waiting, so neither file runs far ahead of the other
+    # when one holds images the other doesn't
+    while not (side1.exhausted and side2.exhausted):
+        if side2.exhausted or (not side1.exhausted and len(side1.pending) <= len(side2.pending)):
+            read(side1, side2)
+        else:
+            read(side2, side1)
+    summary.report()
+
+def record_key_for(path):
+    # GUI CSV exports hold a single unnamed image, so they are keyed without a filename
+    if detect_format(path) == "csv":
+        return lambda record: (None, record["filter"])
+    return lambda record: (record["file"], record["filter"])
+
 def file_diff(file1_path, file2_path):
     try:
-        with open(file1_path, 'r') as file1, open(file2_path, 'r') as file2:
-            file1_lines = file1.readlines()
-            file2_lines = file2.readlines()
-
-            # Compare line by line
-            for i, (line1, line2) in enumerate(zip(file1_lines, file2_lines), start=1):
-                if line1 != line2:
-                    print(f"Difference found at line {i}:")
-                    print(f"File 1: {line1.strip()}")
-                    print(f"File 2: {line2.strip()}")
-                    print()
-            
-            # Check for extra lines in file 1
-            if len(file1_lines) > len(file2_lines):
-                print("Additional lines in File 1:")
-                for line in file1_lines[len(file2_lines):]:
-                    print(f"File 1: {line.strip()}")
-                print()
-
-            # Check for extra lines in file 2
-            elif len(file2_lines) > len(file1_lines):
-                print("Additional lines in File 2:")
-                for line in file2_lines[len(file1_lines):]:
-                    print(f"File 2: {line.strip()}")
-                print()
-
-            print("Comparison completed.")
+        key1 = record_key_for(file1_path)
+        key2 = record_key_for(file2_path)
+        merge_join(iter_records(file1_path), iter_records(file2_path), DiffSummary("File 1", "File 2"), key1, key2)
 
     except FileNotFoundError:
         print("File not found. Please provide valid file paths.")
 
+def filter_diff(sweep_path, filter1, filter2):
+    # Compare two filters from the same autoscan --sweep output file
+    try:
+        records1 = (record for record in iter_records(sweep_path) if record["filter"] == filter1)
+        records2 = (record for record in iter_records(sweep_path) if record["filter"] == filter2)
+        key = lambda record: (record["file"], None)
+        merge_join(records1, records2, DiffSummary(f"Filter {filter1}", f"Filter {filter2}"), key, key)
+    except FileNotFoundError:
+        print("File not found. Please provide a valid file path.")
+
 
 if __name__ == "__main__":
     file1_path = input("Enter the path of the first file: ")
-    file2_path = input("Enter the path of the second file: ")
-    file_diff(file1_path, file2_path)
+    file2_path = input("Enter the path of the second file (leave blank to compare two filters of a sweep file): ")
+    if file2_path:
+        file_diff(file1_path, file2_path)
+    else:
+        filter1 = int(input("Enter the first filter number: "))
+        filter2 = int(input("Enter the second filter number: "))
+        filter_diff(file1_path, filter1, filter2)
@@ -0,0 +1,123 @@
+# Shared image filter pipeline used by autoscan.py and gui.py, so a filter chain tuned in the GUI
+# gives identical results in batch. Kernels are built once, stages write into reusable dst=
+# buffers where OpenCV allows, and every stage can be timed.
+
+import time
+
+import cv2
+import numpy as np
+
+SHARPEN_KERNEL = np.array([[-1, -1, -1],
+                           [-1, 9, -1],
+                           [-1, -1, -1]], np.float32)
+MORPH_KERNEL = np.ones((5, 5), np.uint8)
+
+def sharpen(image, dst=None):
+    return cv2.filter2D(image, -1, SHARPEN_KERNEL, dst=dst)
+
+def gaussian_blur(image, dst=None):
+    return cv2.GaussianBlur(image, (5, 5), 0, dst=dst)
+
+def opening(image, dst=None):
+    return cv2.morphologyEx(image, cv2.MORPH_OPEN, MORPH_KERNEL, dst=dst)
+
+def closing(image, dst=None):
+    return cv2.morphologyEx(image, cv2.MORPH_CLOSE, MORPH_KERNEL, dst=dst)
+
+def erosion(image, dst=None):
+    return cv2.erode(image, MORPH_KERNEL, dst=dst, iterations=1)
+
+def dilation(image, dst=None):
+    return cv2.dilate(image, MORPH_KERNEL, dst=dst, iterations=1)
+
+def grayscale(image, dst=None):
+    if len(image.shape) == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=dst)
+
+# Registry of named stages. Each stage takes (image, dst=None) and returns the filtered image,
+# writing into dst when its shape and type fit.
+STAGES = {
+    "sharpen": sharpen,
+    "blur": gaussian_blur,
+    "opening": opening,
+    "closing": closing,
+    "erosion": erosion,
+    "dilation": dilation,
+    "grayscale": grayscale,
+}
+
+# autoscan.py filter numbers (0 - No filter, 1 - Sharpen, 2 - Gaussian Blur, 3 - Opening,
+# 4 - Closing, 5 - Erosion, 6 - Dilation) as stage chains
+FILTER_TYPE_STAGES = {
+    0: (),
+    1: ("sharpen",),
+    2: ("blur",),
+    3: ("opening",),
+    4: ("closing",),
+    5: ("erosion",),
+    6: ("dilation",),
+}
+
+def register_stage(name, function):
+    # Add a stage to the registry, e.g. register_stage("median", lambda image, dst=None: cv2.medianBlur(image, 3, dst))
+    STAGES[name] = function
+
+def parse_chain(chain):
+    # Stage names for an autoscan filter number, a "blur,sharpen,dilation" string or a sequence of names
+    if isinstance(chain, int):
+        if chain not in FILTER_TYPE_STAGES:
+            raise ValueError(f"Unknown filter type {chain}")
+        return FILTER_TYPE_STAGES[chain]
+    if isinstance(chain, str):
+        chain = [name.strip() for name in chain.split(",") if name.strip()]
+    for name in chain:
+        if name not in STAGES:
+            raise ValueError(f"Unknown filter stage '{name}'. Choose from: {', '.join(STAGES)}")
+    return tuple(chain)
+
+class FilterPipeline:
+    def __init__(self, chain):
+        self.stages = parse_chain(chain)
+
+    def apply(self, image, timings=None):
+        # Run every stage in order. The input image is never modified; intermediate results ping-pong
+        # between two buffers, so a chain of any length allocates at most two images.
+        # If timings is a dict, the seconds spent in each stage are added to timings[stage name].
+        current = image
+        spare = None
+        for name in self.stages:
+            start = time.perf_counter()
+            filtered = STAGES[name](current, dst=spare)
+            if timings is not None:
+                timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+            # The previous intermediate can be reused, but never the caller's image
+            spare = current if current is not image and current is not filtered else None
+            current = filtered
+        return current
+
+    def __repr__(self):
+        return f"FilterPipeline({','.join(self.stages)})"
+
+# Pipelines are built once per chain and reused
+_pipelines = {}
+
+def get_pipeline(chain):
+    key = chain if isinstance(chain, (int, str)) else tuple(chain)
+    pipeline = _pipelines.get(key)
+    if pipeline is None:
+        pipeline = FilterPipeline(chain)
+        _pipelines[key] = pipeline
+    return pipeline
+
+def apply_chain(image, chain, timings=None):
+    return get_pipeline(chain).apply(image, timings)
+
+def to_gray(image, timings=None):
+    # Final grayscale conversion before OCR (a no-op if the chain already ended in grayscale)
+    start = time.perf_counter()
+    gray = grayscale(image)
+    if timings is not None:
+        timings["grayscale"] = timings.get("grayscale", 0.0) + time.perf_counter() - start
+    return gray
@@ -1,15 +1,23 @@
 # Manual GUI test
 
+import argparse
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import numpy as np
 import cv2
-import easyocr
 from PIL import Image, ImageTk
 import csv
+from concurrent.futures import ThreadPoolExecutor
+
+from filters import apply_chain, to_gray
+from ocr_cache import OCRCache, array_key, reader_config
+from ocr_client import ServiceReader
+from ocr_reader import get_reader
+
+# How often the Tk main loop checks on background OCR work, in milliseconds
+POLL_INTERVAL_MS = 50
 
 class TextDetectionApp:
-    def __init__(self, root):
+    def __init__(self, root, server=None):
         # Initialize the TextDetectionApp class
         self.root = root
         self.root.title("Text Detection App")
@@ -28,25 +36,53 @@ class TextDetectionApp:
         self.save_button = tk.Button(self.root, text="Save Text", command=self.save_image)
         self.save_button.pack(pady=5)
 
-        # Initialize EasyOCR reader for text detection
-        self.reader = easyocr.Reader(['en'], gpu=True)
+        # Busy indicator and cancel button for OCR running in the background
+        self.busy_label = tk.Label(self.root, text="")
+        self.busy_label.pack()
+        self.cancel_button = tk.Button(self.root, text="Cancel", command=self.cancel_job, state="disabled")
+        self.cancel_button.pack(pady=5)
+
+        # OCR runs on one worker thread so the window never freezes. job_id identifies the latest
+        # job; results from older (cancelled or superseded) jobs are dropped when they arrive.
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.job_id = 0
+        self.pending_future = None
+
+        # Shared EasyOCR reader for text detection, loaded lazily on first use, or a client of the
+        # OCR service at the server URL, which already has the models loaded
+        self.reader = None
+        self.server = server
+
+        # Persistent OCR result cache shared with autoscan.py
+        self.cache = OCRCache()
+        self.cache_config = reader_config(['en'])
         self.image = None
 
-        # Define image preprocessing options
+        # Detection results for the loaded image, keyed by the filters applied since the last Clear,
+        # so Save and threshold changes reuse them instead of running OCR again
+        self.filter_chain = []
+        self.detections = {}
+        self.showing_detections = False
+
+        # Filters are previewed on a display-sized proxy of the image, cached per filter chain so
+        # switching back and forth is instant. Detection runs the same chain on the full-resolution
+        # original_image and scales the boxes down by scale_factor for display.
+        self.preview_original = None
+        self.preview_cache = {}
+        self.scale_factor = 1.0
+
+        # Define image preprocessing options as filters.py stage names (None for Clear)
         self.preprocess_options = {
-            "Clear": self.no_filter,
-            "Grayscale": cv2.COLOR_BGR2GRAY,
-            "Blur": (cv2.GaussianBlur, (5, 5), 0),
-            "Sharpen": (self.apply_sharpen_filter,),
+            "Clear": None,
+            "Grayscale": "grayscale",
+            "Blur": "blur",
+            "Sharpen": "sharpen",
+            "Opening": "opening",
+            "Closing": "closing",
+            "Erosion": "erosion",
+            "Dilation": "dilation",
         }
 
-        self.preprocess_options.update({
-            "Opening": self.apply_opening_filter,
-            "Closing": self.apply_closing_filter,
-            "Erosion": self.apply_erosion_filter,
-            "Dilation": self.apply_dilation_filter,
-        })
-
         # Initialize default preprocessing option
         self.selected_preprocess = tk.StringVar()
         self.selected_preprocess.set("Clear")  # Default selection
@@ -79,111 +115,143 @@ class TextDetectionApp:
         # Load an image using file dialog.
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png;*.jpg;*.jpeg")])
         if file_path:
-            self.image = cv2.imread(file_path)
-            self.original_image = self.image.copy()  # Store a copy of the original image
+            # Results for the previous image are no longer wanted
+            self.cancel_job()
+            self.filter_chain = []
+            self.detections = {}
+            self.showing_detections = False
+            self.original_image = cv2.imread(file_path)  # Full resolution image used for OCR
 
             # Get the screen width and height
             screen_width = self.root.winfo_screenwidth() / 2
             screen_height = self.root.winfo_screenheight() / 2
 
             # Get the width and height of the loaded image
-            img_height, img_width, _ = self.image.shape
+            img_height, img_width, _ = self.original_image.shape
 
             # Calculate the scaling factor
-            scale_factor = min(screen_width / img_width, screen_height / img_height)
+            self.scale_factor = min(screen_width / img_width, screen_height / img_height)
 
-            # Resize the image while preserving aspect ratio
-            self.image = cv2.resize(self.image, (int(img_width * scale_factor), int(img_height * scale_factor)))
+            # Resize a preview copy while preserving aspect ratio
+            self.preview_original = cv2.resize(self.original_image, (int(img_width * self.scale_factor), int(img_height * self.scale_factor)))
+            self.preview_cache = {(): self.preview_original}
+            self.image = self.preview_original
 
             self.display_image()
             self.enable_buttons()
             self.enable_bottom_row_buttons()
 
-    def display_image(self):
-        # Display the loaded image in the GUI.
-        image_rgb = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+    def display_image(self, image=None):
+        # Display the loaded image (or the given annotated copy of it) in the GUI.
+        if image is None:
+            image = self.image
+        if len(image.shape) == 2:
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        else:
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         image_pil = Image.fromarray(image_rgb)
         image_tk = ImageTk.PhotoImage(image_pil)
         self.image_label.configure(image=image_tk)
         self.image_label.image = image_tk
 
+    def apply_option(self, image, option):
+        # Apply one preprocessing option to an image with the shared filter pipeline
+        return apply_chain(image, [self.preprocess_options[option]])
+
+    def stage_chain(self, chain):
+        # filters.py stage names for a chain of preprocessing options
+        return [self.preprocess_options[option] for option in chain]
+
     def update_display(self, option):
-    # Update the displayed image based on the selected preprocessing option.
+    # Update the displayed preview based on the selected preprocessing option.
         if self.image is not None:
+            self.showing_detections = False
             if option == "Clear":
-                self.image = self.original_image.copy()
+                self.filter_chain = []
+                self.image = self.preview_original
                 self.display_image()
                 self.enable_buttons()
                 self.enable_bottom_row_buttons()
                 return
 
-            preprocess_method = self.preprocess_options[option]
-            if isinstance(preprocess_method, tuple):
-                if len(preprocess_method) == 3:
-                    filtered_image = preprocess_method[0](self.image, preprocess_method[1], preprocess_method[2])
-                else:
-                    filtered_image = preprocess_method[0](self.image)
-            elif callable(preprocess_method):  # Check if preprocess_method is a callable method
-                if preprocess_method == cv2.COLOR_BGR2GRAY:  # Check if preprocess_method is grayscale conversion
-                    filtered_image = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
-                else:
-                    filtered_image = preprocess_method(self.image)
-            else:
-                # Skip if preprocess_method is not callable
-                return
+            chain = self.filter_chain + [option]
+            filtered_image = self.preview_cache.get(tuple(chain))
+            if filtered_image is None:
+                filtered_image = self.apply_option(self.image, option)
+                self.preview_cache[tuple(chain)] = filtered_image
 
             # Display the filtered image
             self.image = filtered_image
+            self.filter_chain = chain
             self.display_image()
             self.enable_buttons()
 
-
     def detect_text(self):
         # Detect text in the loaded image
         if self.image is None:
             print("Error: Please load an image first.")
             return
 
-        # Capture threshold value from the scale widget
-        threshold = self.threshold_scale.get()
+        # Only run OCR when the image or filters changed since the last detection
+        key = tuple(self.filter_chain)
+        if key in self.detections:
+            self.show_detections(self.detections[key])
+            return
 
-        # Disable all buttons
-        self.disable_buttons()
+        # Perform text detection in the background; clicking again replaces this job
+        chain = list(self.filter_chain)
+        self.run_in_background(lambda: self.full_resolution_text(chain),
+                               lambda text_results: self.detection_finished(key, text_results),
+                               "Detecting text...")
+
+    def full_resolution_text(self, chain):
+        # Run the filter chain on the full resolution image and OCR it (runs on the worker thread).
+        # This is the same pipeline as "py autoscan.py --chain", so both give identical results.
+        filtered_image = apply_chain(self.original_image, self.stage_chain(chain))
+        return self.read_text(to_gray(filtered_image))
+
+    def detection_finished(self, key, text_results):
+        # Keep the results for this filter state, print them and draw them
+        self.detections[key] = text_results
+        print(f"Filter chain: {','.join(self.stage_chain(key)) or 'none'}")
+        for result in text_results:
+            print(result)  # Print the tuple
 
-        if len(self.image.shape) == 3 and self.image.shape[2] == 3:
-            preprocessed_image = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
-        else:
-            preprocessed_image = self.image
+        # Print a new line after printing all tuples
+        print()
 
-        # Clear existing rectangles and text
-        self.image = self.original_image.copy()
-        self.display_image()
+        # Only draw them if the filters haven't changed while OCR was running
+        if key == tuple(self.filter_chain):
+            self.show_detections(text_results)
 
-        # Perform text detection
-        text_results = self.reader.readtext(preprocessed_image)
+    def show_detections(self, text_results):
+        # Draw the detection results above the current threshold (runs on the Tk thread)
+        threshold = self.threshold_scale.get()
+
+        # Draw on a fresh copy of the preview so redraws start without the previous rectangles and text
+        annotated = self.preview_original.copy()
         for result in text_results:
-            print(result)  # Print the tuple
             if len(result) >= 3:  # Check if the tuple has at least three elements
                 bbox, text, confidence = result[:3]  # Extract the first three elements
-                method = ""  # Default value for method
-                if len(result) >= 4:
-                    method = result[3]  # Extract the fourth element if available
                 if confidence > threshold:  # Apply threshold filtering
-                    # Extract coordinates from the bounding box
-                    pt1 = (int(bbox[0][0]), int(bbox[0][1]))
-                    pt2 = (int(bbox[2][0]), int(bbox[2][1]))
-                    cv2.rectangle(self.image, pt1, pt2, (0, 0, 255), 2)
-                    cv2.putText(self.image, text, pt1, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-        self.display_image()
-
-        # Print a new line after printing all tuples
-        print()
+                    # Extract coordinates from the full resolution bounding box and map them onto the preview
+                    pt1 = (int(bbox[0][0] * self.scale_factor), int(bbox[0][1] * self.scale_factor))
+                    pt2 = (int(bbox[2][0] * self.scale_factor), int(bbox[2][1] * self.scale_factor))
+                    cv2.rectangle(annotated, pt1, pt2, (0, 0, 255), 2)
+                    cv2.putText(annotated, text, pt1, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+        self.display_image(annotated)
+        self.showing_detections = True
 
         self.disable_bottom_besides_clear()  # Disable bottom row buttons besides clear
 
     def update_threshold(self, value):
         self.threshold = float(value)
 
+        # Redraw the stored boxes for the new threshold without running OCR again
+        key = tuple(self.filter_chain)
+        if self.showing_detections and key in self.detections:
+            self.show_detections(self.detections[key])
+
     def save_image(self):
         # Save the detected text data to a CSV file.
         if self.image is None:
@@ -192,50 +260,79 @@ class TextDetectionApp:
 
         file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
         if file_path:
-            # Perform text detection
-            if len(self.image.shape) == 3 and self.image.shape[2] == 3:
-                preprocessed_image = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
-            else:
-                preprocessed_image = self.image
-            text_results = self.reader.readtext(preprocessed_image)
-
-            # Save text data to CSV
-            self.save_text_data_to_csv(text_results, file_path)
-            messagebox.showinfo("Success", "Text data saved to CSV successfully.")
-
-
-    def no_filter(self, image):
-        # Return the original image without any preprocessing.
-        return image
-
-    def apply_sharpen_filter(self, image):
-        # Apply sharpening filter to the image.
-        sharpen_kernel = np.array([[-1, -1, -1],
-                                   [-1, 9, -1],
-                                   [-1, -1, -1]])
-        return cv2.filter2D(image, -1, sharpen_kernel)
-
-    # new filters start
-    def apply_opening_filter(self, image):
-        # Apply opening filter to the image
-        kernel = np.ones((5, 5), np.uint8)
-        return cv2.morphologyEx(image, cv2.MORPH_OPEN, kernel)
-
-    def apply_closing_filter(self, image):
-        # Apply closing filter to the image
-        kernel = np.ones((5, 5), np.uint8)
-        return cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernel)
-
-    def apply_erosion_filter(self, image):
-        # Apply erosion filter to the image
-        kernel = np.ones((5, 5), np.uint8)
-        return cv2.erode(image, kernel, iterations=1)
-
-    def apply_dilation_filter(self, image):
-        # Apply dilation filter to the image
-        kernel = np.ones((5, 5), np.uint8)
-        return cv2.dilate(image, kernel, iterations=1)
-    # new filters end
+            key = tuple(self.filter_chain)
+
+            def save_results(text_results):
+                # Save text data to CSV
+                self.detections[key] = text_results
+                self.save_text_data_to_csv(text_results, file_path)
+                messagebox.showinfo("Success", "Text data saved to CSV successfully.")
+
+            # Export the results of the last detection when there is one for this filter state
+            if key in self.detections:
+                save_results(self.detections[key])
+                return
+
+            # Perform text detection on the full resolution image
+            chain = list(self.filter_chain)
+            self.run_in_background(lambda: self.full_resolution_text(chain), save_results, "Reading text to save...")
+
+    def run_in_background(self, work, on_done, busy_text):
+        # Run work() on the OCR thread and pass its result to on_done on the Tk thread.
+        # Any job still pending is dropped, so repeated clicks coalesce into the latest one.
+        self.cancel_job()
+        self.job_id += 1
+        future = self.executor.submit(work)
+        self.pending_future = future
+        self.busy_label.config(text=busy_text)
+        self.cancel_button.config(state="normal")
+        self.root.after(POLL_INTERVAL_MS, self.poll_job, self.job_id, future, on_done)
+
+    def poll_job(self, job_id, future, on_done):
+        # Wait for a background job without blocking the main loop
+        if job_id != self.job_id:
+            return  # cancelled or replaced by a newer job
+        if not future.done():
+            self.root.after(POLL_INTERVAL_MS, self.poll_job, job_id, future, on_done)
+            return
+
+        self.pending_future = None
+        self.busy_label.config(text="")
+        self.cancel_button.config(state="disabled")
+        try:
+            result = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Text detection failed: {e}")
+            return
+        on_done(result)
+
+    def cancel_job(self):
+        # Drop the pending background job. An OCR call that already started finishes on the
+        # worker thread, but its result is ignored.
+        if self.pending_future is None:
+            return
+        self.pending_future.cancel()
+        self.pending_future = None
+        self.job_id += 1
+        self.busy_label.config(text="")
+        self.cancel_button.config(state="disabled")
+
+    def get_reader(self):
+        # Fetch the shared OCR reader the first time text is detected
+        if self.reader is None:
+            self.reader = ServiceReader(self.server) if self.server else get_reader(['en'], gpu=True)
+        return self.reader
+
+    def read_text(self, preprocessed_image):
+        # Run OCR through the result cache so detecting the same pixels again skips the model
+        key = array_key(preprocessed_image, self.cache_config)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return [(bbox, text, confidence) for text, confidence, bbox in cached]
+
+        text_results = self.get_reader().readtext(preprocessed_image)
+        self.cache.put(key, [(text, confidence, bbox) for bbox, text, confidence in text_results])
+        return text_results
 
     def disable_bottom_row_buttons(self):
         # Disable buttons in the bottom row (excluding "Clear")
@@ -287,10 +384,15 @@ class TextDetectionApp:
 
 def main():
     # Create the Tkinter application and run the TextDetectionApp.
+    parser = argparse.ArgumentParser(description="Text detection GUI.")
+    parser.add_argument("--server", help="send OCR to a running ocr_service.py at this URL, e.g. http://127.0.0.1:8765")
+    args = parser.parse_args()
 
     root = tk.Tk()
-    app = TextDetectionApp(root)
+    app = TextDetectionApp(root, args.server)
     root.mainloop()
+    app.executor.shutdown(wait=True, cancel_futures=True)
+    app.cache.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,116 @@
+# Persistent OCR result cache. Results are stored in a local SQLite file keyed by a hash of the
+# image bytes plus the filter type and reader config, so re-scanning unchanged images skips OCR.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = "ocr_cache.sqlite"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# How many inserts happen between size checks
+EVICT_CHECK_INTERVAL = 100
+
+def reader_config(languages=('en',), **readtext_options):
+    # Reader settings that change the OCR output and therefore belong in the cache key
+    return {"languages": list(languages), "readtext": readtext_options}
+
+def make_key(data, filter_type, config):
+    # Hash of the image bytes, filter type and reader config
+    digest = hashlib.sha256()
+    digest.update(data)
+    digest.update(json.dumps([filter_type, config], sort_keys=True).encode())
+    return digest.hexdigest()
+
+def array_key(image, config):
+    # Cache key for an in-memory image; the shape is included so equal bytes with different shapes don't collide
+    data = f"{image.shape}{image.dtype}".encode() + image.tobytes()
+    return make_key(data, None, config)
+
+def to_json_value(value):
+    # Convert numpy scalars inside bboxes to plain Python numbers
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Cannot store {type(value)} in the OCR cache")
+
+class OCRCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, bypass=False):
+        # bypass=True turns every lookup into a miss and every store into a no-op
+        self.path = path
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.lock = threading.Lock()
+        self.connection = None
+        if not bypass:
+            self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def get(self, key):
+        # Return the cached [(text, confidence, bbox), ...] for this key, or None on a miss
+        if self.bypass:
+            return None
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return [(text, confidence, bbox) for text, confidence, bbox in json.loads(row[0])]
+
+    def put(self, key, text_data):
+        # Store the detections for this key
+        if self.bypass:
+            return
+        value = json.dumps([[text, confidence, bbox] for text, confidence, bbox in text_data], default=to_json_value)
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, len(key) + len(value), time.time()))
+            self.inserts += 1
+            if self.inserts % EVICT_CHECK_INTERVAL == 0:
+                self.evict_locked()
+
+    def evict(self):
+        # Drop least recently used entries until the cache fits in max_bytes
+        if self.bypass:
+            return
+        with self.lock:
+            self.evict_locked()
+
+    def evict_locked(self):
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.connection.execute("SELECT key, size FROM results ORDER BY last_used")
+        stale_keys = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale_keys.append((key,))
+            total -= size
+        self.connection.executemany("DELETE FROM results WHERE key = ?", stale_keys)
+
+    def stats(self):
+        # Summary line of the cache counters for this run
+        if self.bypass:
+            return "OCR cache bypassed"
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        return f"OCR cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate)"
+
+    def close(self):
+        if self.connection is not None:
+            self.evict()
+            self.connection.close()
+            self.connection = None
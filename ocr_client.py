@@ -0,0 +1,77 @@
+# Client for the local OCR service (ocr_service.py). ServiceReader has the readtext and
+# readtext_batched methods autoscan.py and gui.py use from easyocr.Reader, so either can send its OCR
+# to a warm service instead of loading the models itself.
+
+import base64
+import json
+import urllib.error
+import urllib.request
+
+import cv2
+
+DEFAULT_SERVICE_URL = "http://127.0.0.1:8765"
+DEFAULT_TIMEOUT = 600  # seconds; a batch waits behind the service's other work
+
+class ServiceError(ConnectionError):
+    # The service answered with an error, e.g. a failed OCR batch. A ConnectionError like an
+    # unreachable service, so callers handle both the same way.
+    pass
+
+def encode_image(image):
+    # Lossless PNG with light compression, so the service OCRs exactly these pixels
+    ok, encoded = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    if not ok:
+        raise ValueError("Failed to encode image for the OCR service")
+    return base64.b64encode(encoded.tobytes()).decode("ascii")
+
+def from_response(detections):
+    # Service detections back to EasyOCR's (bbox, text, confidence) tuples
+    return [(detection["bbox"], detection["text"], detection["confidence"]) for detection in detections]
+
+class ServiceReader:
+    def __init__(self, url=DEFAULT_SERVICE_URL, timeout=DEFAULT_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise ServiceError(f"OCR service error: {e.read().decode(errors='replace')}")
+        except urllib.error.URLError as e:
+            raise ConnectionError(f"OCR service at {self.url} is not reachable: {e.reason}")
+
+    def ocr(self, images, filter_type=0):
+        # OCR [{"path": ...} or {"data": base64 image file}, ...] after the service applies filter_type.
+        # Returns EasyOCR style results for each image; images the service couldn't load raise ValueError.
+        # Raises ServiceError when the service fails the request and ConnectionError when it can't be reached.
+        response = self.request("/ocr", {"images": images, "filter": filter_type})
+        results = []
+        for result in response["results"]:
+            if "error" in result:
+                raise ValueError(result["error"])
+            results.append(from_response(result["detections"]))
+        return results
+
+    def ocr_path(self, path, filter_type=0):
+        # The path is opened by the service, so it must be visible to it
+        return self.ocr([{"path": path}], filter_type)[0]
+
+    def ocr_bytes(self, data, filter_type=0):
+        return self.ocr([{"data": base64.b64encode(data).decode("ascii")}], filter_type)[0]
+
+    def readtext(self, image):
+        return self.readtext_batched([image])[0]
+
+    def readtext_batched(self, images):
+        # Send already preprocessed images; the service batches them with other clients' work
+        return self.ocr([{"data": encode_image(image)} for image in images])
+
+    def health(self):
+        return self.request("/health")
+
+    def __repr__(self):
+        return f"ServiceReader({self.url})"
@@ -0,0 +1,51 @@
+# Shared EasyOCR reader lifecycle. Loading the detection and recognition models is slow,
+# so readers are created lazily on first use and reused for the rest of the process.
+# easyocr (and with it torch) is only imported then, so clients of the OCR service never load it.
+
+import threading
+import time
+
+# Readers and their (start, seconds) setup spans, keyed by (languages, gpu)
+_readers = {}
+_setup_spans = {}
+_lock = threading.Lock()
+
+def reader_key(languages=('en',), gpu=True):
+    # Normalize the reader settings into a hashable key
+    return (tuple(languages), bool(gpu))
+
+def get_reader(languages=('en',), gpu=True):
+    # Return the warm reader for these settings, creating it on first use
+    key = reader_key(languages, gpu)
+    with _lock:
+        reader = _readers.get(key)
+        if reader is None:
+            start = time.perf_counter()
+            import easyocr
+            reader = easyocr.Reader(list(key[0]), gpu=key[1])
+            _setup_spans[key] = (start, time.perf_counter() - start)
+            _readers[key] = reader
+    return reader
+
+def setup_time(languages=('en',), gpu=True):
+    # Seconds spent loading the reader for these settings, or None if it was never loaded
+    span = setup_span(languages, gpu)
+    return span[1] if span is not None else None
+
+def setup_span(languages=('en',), gpu=True):
+    # (time.perf_counter() start, seconds) of the reader's model load, or None if it was never loaded
+    return _setup_spans.get(reader_key(languages, gpu))
+
+def describe_setup(languages=('en',), gpu=True):
+    # Human readable summary of the reader setup cost
+    seconds = setup_time(languages, gpu)
+    device = "GPU" if gpu else "CPU"
+    if seconds is None:
+        return f"OCR reader {list(languages)} ({device}) not loaded"
+    return f"OCR reader {list(languages)} ({device}) loaded in {seconds:.2f}s"
+
+def clear_readers():
+    # Drop all cached readers so their models can be garbage collected
+    with _lock:
+        _readers.clear()
+        _setup_spans.clear()
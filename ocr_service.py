@@ -0,0 +1,186 @@
+# Long-lived local OCR service. One process loads the EasyOCR models once and serves OCR requests
+# over localhost HTTP, so autoscan.py (--server) and gui.py (--server) skip the model load on every
+# start. Requests from all clients are collected into micro-batches for readtext_batched.
+#
+# POST /ocr    {"images": [{"path": ...} or {"data": base64 image file}, ...], "filter": 0-6 or chain}
+#           -> {"results": [{"detections": [{"text", "confidence", "bbox"}]} or {"error": ...}, ...]}
+# GET /health -> {"reader": ..., "requests": ..., "batches": ..., "images": ...}
+
+import argparse
+import base64
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from autoscan import load_image, preprocess_image, read_text_batched
+from filters import parse_chain
+from ocr_reader import describe_setup, get_reader
+from scan_output import plain_bbox
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH = 8
+DEFAULT_MAX_WAIT_MS = 10
+
+class MicroBatcher:
+    # Collects grayscale images from any number of request threads and OCRs them on one thread,
+    # up to max_batch at a time. After the first image arrives it waits at most max_wait seconds
+    # for more, so a lone request is barely delayed while concurrent ones share a batch.
+    def __init__(self, reader, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT_MS / 1000):
+        self.reader = reader
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.images = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, gray):
+        # Returns a Future for the image's EasyOCR style results
+        future = Future()
+        self.queue.put((gray, future))
+        return future
+
+    def next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                # read_text_batched groups equally sized images into one readtext_batched call
+                text_datas = read_text_batched(self.reader, [gray for gray, future in batch])
+            except Exception as e:
+                for gray, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.images += len(batch)
+            for (gray, future), text_data in zip(batch, text_datas):
+                future.set_result(text_data)
+
+def decode_image(image):
+    # A request image ({"path"} or {"data"}) as an OpenCV image
+    if "path" in image:
+        return load_image(image["path"])
+    buffer = np.frombuffer(base64.b64decode(image["data"]), np.uint8)
+    decoded = cv2.imdecode(buffer, cv2.IMREAD_UNCHANGED)
+    if decoded is None:
+        raise ValueError("Failed to decode image data")
+    if decoded.ndim == 3 and decoded.shape[2] == 4:
+        decoded = cv2.cvtColor(decoded, cv2.COLOR_BGRA2BGR)
+    return decoded
+
+class OCRRequestHandler(BaseHTTPRequestHandler):
+    # The server object carries the batcher and the request counter
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        batcher = self.server.batcher
+        self.send_json(200, {"reader": self.server.description, "requests": self.server.requests,
+                             "batches": batcher.batches, "images": batcher.images})
+
+    def do_POST(self):
+        if self.path != "/ocr":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            filter_type = body.get("filter", 0)
+            parse_chain(filter_type)
+            images = body["images"]
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": f"Bad request: {e}"})
+            return
+        self.server.requests += 1
+
+        # Decode and filter on this request's thread, then queue the images for the batcher
+        pending = []
+        for image in images:
+            try:
+                pending.append(self.server.batcher.submit(preprocess_image(decode_image(image), filter_type)))
+            except (ValueError, KeyError, TypeError) as e:
+                pending.append(str(e))
+
+        results = []
+        try:
+            for item in pending:
+                if isinstance(item, str):
+                    results.append({"error": item})
+                    continue
+                detections = [{"text": text, "confidence": float(confidence), "bbox": plain_bbox(bbox)}
+                              for text, confidence, bbox in item.result()]
+                results.append({"detections": detections})
+        except Exception as e:
+            self.send_json(500, {"error": f"OCR failed: {e}"})
+            return
+        self.send_json(200, {"results": results})
+
+    def log_message(self, format, *args):
+        # Keep the terminal for the startup and error messages
+        pass
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, languages=('en',), gpu=True, max_batch=DEFAULT_MAX_BATCH,
+          max_wait_ms=DEFAULT_MAX_WAIT_MS):
+    # Load the reader once and serve until interrupted
+    reader = get_reader(languages, gpu)
+    server = ThreadingHTTPServer((host, port), OCRRequestHandler)
+    server.daemon_threads = True
+    server.batcher = MicroBatcher(reader, max_batch, max_wait_ms / 1000)
+    server.description = describe_setup(languages, gpu)
+    server.requests = 0
+    print(server.description)
+    print(f"OCR service listening on http://{host}:{port} (batches of up to {max_batch}, waiting up to {max_wait_ms}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local OCR service that keeps the EasyOCR models loaded.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST}, this machine only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help=f"most images per OCR batch (default: {DEFAULT_MAX_BATCH})")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help=f"how long a batch waits for more images after the first arrives (default: {DEFAULT_MAX_WAIT_MS})")
+    parser.add_argument("--cpu", action="store_true", help="run the OCR reader on the CPU")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.max_batch < 1 or args.max_wait_ms < 0:
+        print("Invalid batch settings. Please provide a max batch of 1 or more and a wait of 0 or more.")
+        return
+    serve(args.host, args.port, gpu=not args.cpu, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Checkpoints for long autoscan runs. Completed filenames are appended to "<output>.ckpt" together
+# with the output file size at the last fsync, so an interrupted scan can resume where it stopped.
+
+import json
+import os
+
+CHECKPOINT_SUFFIX = ".ckpt"
+DEFAULT_SYNC_EVERY = 50
+
+class ScanCheckpoint:
+    def __init__(self, output_file, settings, sync_every=DEFAULT_SYNC_EVERY):
+        # settings must match on resume, so a filter 2 run isn't continued as filter 5
+        self.output_file = output_file
+        self.path = output_file + CHECKPOINT_SUFFIX
+        self.settings = settings
+        self.sync_every = sync_every
+        self.done = set()
+        self.pending = []
+        self.output = None
+        self.checkpoint = None
+
+    def open(self, resume=False, binary=False):
+        # Open the output file for writing records. When resuming, anything written after the last
+        # checkpoint (including a partially written record) is truncated away and redone.
+        committed_end = self.load() if resume else None
+        mode = 'b' if binary else ''
+        if committed_end is None:
+            self.done = set()
+            self.output = open(self.output_file, 'w' + mode)
+            self.checkpoint = open(self.path, 'w')
+            self.checkpoint.write(json.dumps({"settings": self.settings}) + "\n")
+            self.fsync(self.checkpoint)
+        else:
+            os.truncate(self.output_file, committed_end)
+            self.output = open(self.output_file, 'a' + mode)
+            self.checkpoint = open(self.path, 'a')
+        return self.output
+
+    def load(self):
+        # Read the checkpoint into self.done and return the committed output size,
+        # or None if there is nothing to resume from
+        if not os.path.exists(self.path) or not os.path.exists(self.output_file):
+            return None
+
+        committed_end = 0
+        valid_end = 0
+        with open(self.path, 'rb') as checkpoint:
+            header = checkpoint.readline()
+            try:
+                settings = json.loads(header)["settings"]
+            except (ValueError, KeyError):
+                return None
+            if settings != self.settings:
+                raise ValueError(f"Checkpoint {self.path} was written with different settings: {settings}")
+            valid_end = checkpoint.tell()
+
+            for line in checkpoint:
+                # A crash can leave the last line half written; everything before it is still good
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                self.done.add(entry["file"])
+                committed_end = entry["end"]
+                valid_end = checkpoint.tell()
+
+        if os.path.getsize(self.output_file) < committed_end:
+            print(f"Output file {self.output_file} is shorter than its checkpoint, starting over.")
+            return None
+
+        # Drop the half written checkpoint line so new entries start on a clean line
+        os.truncate(self.path, valid_end)
+        return committed_end
+
+    def mark_done(self, filename):
+        # Record that every output line for this image has been written. The output size is taken
+        # here, so a record that is half written when the scan stops is never counted as done.
+        self.output.flush()
+        self.pending.append((filename, os.fstat(self.output.fileno()).st_size))
+        if len(self.pending) >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        # fsync the output first, then checkpoint the images it now fully contains
+        if not self.pending:
+            return
+        self.fsync(self.output)
+        for filename, end in self.pending:
+            self.checkpoint.write(json.dumps({"file": filename, "end": end}) + "\n")
+            self.done.add(filename)
+        self.fsync(self.checkpoint)
+        self.pending = []
+
+    def fsync(self, f):
+        f.flush()
+        os.fsync(f.fileno())
+
+    def close(self):
+        if self.output is not None:
+            self.sync()
+            self.output.close()
+            self.checkpoint.close()
+            self.output = None
+            self.checkpoint = None
@@ -0,0 +1,239 @@
+# Scan output formats. Every format stores the same per-image records:
+#   {"file": ..., "filter": ... or None, "detections": [{"text", "confidence", "bbox"}], "timings": {...},
+#    "size": [width, height] or None, "duplicate_of": file or None}
+# - text     : the original "File: / Text: ..., Confidence: ..." lines (no bboxes, timings or sizes)
+# - jsonl    : one JSON record per line, streamed as images finish
+# - columnar : compact binary chunks with packed confidence and bbox columns, for large runs
+# iter_records reads any of them back, plus the GUI's CSV export.
+
+import csv
+import json
+import os
+import struct
+from array import array
+
+FORMATS = ("text", "jsonl", "columnar")
+BINARY_FORMATS = ("columnar",)
+
+COLUMNAR_MAGIC = b"OCRCOL1\n"
+COLUMNAR_CHUNK_RECORDS = 1000
+GUI_CSV_HEADER = "Text,Confidence Level"
+
+def make_record(filename, filter_type, text_data, timings=None, size=None, duplicate_of=None):
+    # Build a record from ocr_image style [(text, confidence, bbox), ...] detections.
+    # size is the image's (width, height), or None when it wasn't decoded (e.g. cached results).
+    # duplicate_of names the image whose detections were reused for a near-duplicate that wasn't OCRed.
+    detections = []
+    for text, confidence, bbox in text_data:
+        detections.append({"text": text, "confidence": float(confidence), "bbox": plain_bbox(bbox)})
+    return {"file": filename, "filter": filter_type, "detections": detections, "timings": timings or {},
+            "size": list(size) if size is not None else None, "duplicate_of": duplicate_of}
+
+def plain_bbox(bbox):
+    # Convert an EasyOCR bbox (which may hold numpy numbers) to a list of [x, y] floats
+    if bbox is None:
+        return None
+    return [[float(x), float(y)] for x, y in bbox]
+
+class TextWriter:
+    def __init__(self, f):
+        self.f = f
+        self.buffered = 0
+
+    def write(self, record):
+        # Write the extracted text and confidence values for one image to the output file.
+        # Sweep runs tag each record with the filter it was scanned with.
+        self.f.write(f"File: {record['file']}\n")
+        if record["filter"] is not None:
+            self.f.write(f"Filter: {record['filter']}\n")
+        if record.get("duplicate_of") is not None:
+            self.f.write(f"Duplicate of: {record['duplicate_of']}\n")
+        for detection in record["detections"]:
+            self.f.write(f"Text: {detection['text']}, Confidence: {detection['confidence']}\n")
+        self.f.write('\n')
+
+    def close(self):
+        pass
+
+class JSONLWriter:
+    def __init__(self, f):
+        self.f = f
+        self.buffered = 0
+
+    def write(self, record):
+        self.f.write(json.dumps(record) + "\n")
+
+    def close(self):
+        pass
+
+class ColumnarWriter:
+    # Records are buffered into column arrays and written as one chunk every chunk_records records.
+    # Chunk layout: <u32 header length><JSON header><float64 confidences><float64 bboxes>
+    def __init__(self, f, chunk_records=COLUMNAR_CHUNK_RECORDS):
+        self.f = f
+        self.chunk_records = chunk_records
+        if f.tell() == 0:
+            f.write(COLUMNAR_MAGIC)
+        self.reset()
+
+    def reset(self):
+        self.buffered = 0
+        self.files = []
+        self.filters = []
+        self.timings = []
+        self.sizes = []
+        self.duplicates = []
+        self.counts = []
+        self.texts = []
+        self.has_bbox = []
+        self.confidences = array('d')
+        self.bboxes = array('d')
+
+    def write(self, record):
+        self.files.append(record["file"])
+        self.filters.append(record["filter"])
+        self.timings.append(record["timings"])
+        self.sizes.append(record.get("size"))
+        self.duplicates.append(record.get("duplicate_of"))
+        self.counts.append(len(record["detections"]))
+        for detection in record["detections"]:
+            self.texts.append(detection["text"])
+            self.confidences.append(detection["confidence"])
+            bbox = detection["bbox"]
+            self.has_bbox.append(bbox is not None)
+            if bbox is not None:
+                self.bboxes.extend(coordinate for point in bbox for coordinate in point)
+        self.buffered += 1
+        if self.buffered >= self.chunk_records:
+            self.flush_chunk()
+
+    def flush_chunk(self):
+        # Write the buffered records as one chunk
+        if not self.buffered:
+            return
+        header = json.dumps({
+            "files": self.files, "filters": self.filters, "timings": self.timings, "sizes": self.sizes,
+            "duplicates": self.duplicates, "counts": self.counts,
+            "texts": self.texts, "has_bbox": self.has_bbox,
+            "confidences": len(self.confidences), "bboxes": len(self.bboxes),
+        }).encode()
+        self.f.write(struct.pack("<I", len(header)))
+        self.f.write(header)
+        self.f.write(self.confidences.tobytes())
+        self.f.write(self.bboxes.tobytes())
+        self.reset()
+
+    def close(self):
+        self.flush_chunk()
+
+def open_writer(output_format, f):
+    # Writer for one of FORMATS on an already open file (binary mode for BINARY_FORMATS)
+    if output_format == "jsonl":
+        return JSONLWriter(f)
+    if output_format == "columnar":
+        return ColumnarWriter(f)
+    return TextWriter(f)
+
+def detect_format(path):
+    # Guess the format of an output file from its first bytes
+    with open(path, 'rb') as f:
+        head = f.read(len(COLUMNAR_MAGIC))
+        if head == COLUMNAR_MAGIC:
+            return "columnar"
+        f.seek(0)
+        first_line = f.readline().decode('utf-8', errors='replace').strip()
+    if first_line.startswith("{"):
+        return "jsonl"
+    if first_line.startswith(GUI_CSV_HEADER):
+        return "csv"
+    return "text"
+
+def iter_records(path):
+    # Stream the records of an output file one at a time, whatever its format
+    output_format = detect_format(path)
+    if output_format == "columnar":
+        return iter_columnar_records(path)
+    if output_format == "jsonl":
+        return iter_jsonl_records(path)
+    if output_format == "csv":
+        return iter_csv_records(path)
+    return iter_text_records(path)
+
+def iter_jsonl_records(path):
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_text_records(path):
+    # Parse the "File: / Filter: / Text: ..., Confidence: ..." text format
+    record = None
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("File: "):
+                if record is not None:
+                    yield record
+                record = {"file": line[len("File: "):], "filter": None, "detections": [], "timings": {}, "size": None,
+                          "duplicate_of": None}
+            elif record is None:
+                continue
+            elif line.startswith("Filter: "):
+                filter_type = line[len("Filter: "):]
+                record["filter"] = int(filter_type) if filter_type.isdigit() else filter_type
+            elif line.startswith("Duplicate of: "):
+                record["duplicate_of"] = line[len("Duplicate of: "):]
+            elif line.startswith("Text: "):
+                # The text itself may contain commas, so split on the last Confidence field
+                text, _, confidence = line[len("Text: "):].rpartition(", Confidence: ")
+                record["detections"].append({"text": text, "confidence": float(confidence), "bbox": None})
+            elif line == "":
+                yield record
+                record = None
+    if record is not None:
+        yield record
+
+def iter_csv_records(path):
+    # The GUI saves one image per CSV file, so the whole file is one record named after it
+    detections = []
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) >= 2:
+                detections.append({"text": row[0], "confidence": float(row[1]), "bbox": None})
+    yield {"file": os.path.basename(path), "filter": None, "detections": detections, "timings": {}, "size": None,
+           "duplicate_of": None}
+
+def iter_columnar_records(path):
+    with open(path, 'rb') as f:
+        f.read(len(COLUMNAR_MAGIC))
+        while True:
+            size = f.read(4)
+            if len(size) < 4:
+                return
+            header = json.loads(f.read(struct.unpack("<I", size)[0]))
+            confidences = array('d')
+            confidences.frombytes(f.read(header["confidences"] * 8))
+            bboxes = array('d')
+            bboxes.frombytes(f.read(header["bboxes"] * 8))
+
+            # Files written before image sizes or duplicates were recorded have no such columns
+            sizes = header.get("sizes") or [None] * len(header["files"])
+            duplicates = header.get("duplicates") or [None] * len(header["files"])
+            detection_index = 0
+            bbox_index = 0
+            for filename, filter_type, timings, size, duplicate_of, count in zip(header["files"], header["filters"], header["timings"],
+                                                                               sizes, duplicates, header["counts"]):
+                detections = []
+                for _ in range(count):
+                    bbox = None
+                    if header["has_bbox"][detection_index]:
+                        values = bboxes[bbox_index:bbox_index + 8]
+                        bbox = [[values[i], values[i + 1]] for i in range(0, 8, 2)]
+                        bbox_index += 8
+                    detections.append({"text": header["texts"][detection_index],
+                                       "confidence": confidences[detection_index], "bbox": bbox})
+                    detection_index += 1
+                yield {"file": filename, "filter": filter_type, "detections": detections, "timings": timings, "size": size,
+                       "duplicate_of": duplicate_of}
@@ -0,0 +1,111 @@
+# Staged streaming pipeline for autoscan. A thread pool prefetches (decodes and filters) images ahead
+# of the OCR stage and a writer thread handles output, connected by bounded queues so memory stays
+# limited by the queue depths. Each stage reports its throughput and each queue its occupancy, which
+# shows which stage limits a run.
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class StageStats:
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds, items=1):
+        with self.lock:
+            self.items += items
+            self.busy += seconds
+
+    def report(self, wall_seconds):
+        # Items per second over the whole run, and how fast the stage could go if it never waited
+        rate = self.items / wall_seconds if wall_seconds > 0 else 0.0
+        busy_per_worker = self.busy / self.workers
+        capacity = self.items / busy_per_worker if busy_per_worker > 0 else float("inf")
+        utilization = busy_per_worker / wall_seconds * 100 if wall_seconds > 0 else 0.0
+        return (f"{self.name}: {self.items} images, {rate:.2f} images/s, "
+                f"capacity {capacity:.2f} images/s, {utilization:.0f}% busy")
+
+class QueueStats:
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.samples = 0
+        self.total = 0
+        self.max = 0
+
+    def sample(self, size):
+        self.samples += 1
+        self.total += size
+        self.max = max(self.max, size)
+
+    def report(self):
+        average = self.total / self.samples if self.samples else 0.0
+        return f"{self.name} queue: average {average:.1f}/{self.capacity}, max {self.max}/{self.capacity}"
+
+def timed_call(function, item, stats):
+    start = time.perf_counter()
+    result = function(item)
+    stats.add(time.perf_counter() - start)
+    return result
+
+def prefetch(items, function, threads, depth, stats, queue_stats):
+    # Yield function(item) for every item in input order, with up to `depth` calls running ahead
+    # on `threads` threads. OpenCV releases the GIL while decoding and filtering, so this overlaps
+    # disk and preprocessing work with OCR in the consumer.
+    iterator = iter(items)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for item in iterator:
+            pending.append(executor.submit(timed_call, function, item, stats))
+            if len(pending) >= depth:
+                break
+        while pending:
+            # Finished items waiting for the consumer; a full queue means the consumer is the bottleneck
+            queue_stats.sample(sum(1 for future in pending if future.done()))
+            result = pending.popleft().result()
+            for item in iterator:
+                pending.append(executor.submit(timed_call, function, item, stats))
+                break
+            yield result
+
+class BackgroundWriter:
+    # Runs handle(item) for each queued item on a writer thread, in order
+    def __init__(self, handle, depth, stats, queue_stats):
+        self.handle = handle
+        self.stats = stats
+        self.queue_stats = queue_stats
+        self.queue = queue.Queue(maxsize=depth)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # keep draining so the producer never blocks
+            try:
+                timed_call(self.handle, item, self.stats)
+            except BaseException as e:
+                self.error = e
+
+    def put(self, item):
+        self.queue_stats.sample(self.queue.qsize())
+        self.queue.put(item)
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        # Wait for everything queued to be written, then re-raise any error from the writer thread
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,71 @@
+# Optional timing instrumentation for autoscan. When a run is traced, every stage of every image
+# (load, each filter stage, detection, recognition, writing) and the reader's model load are recorded
+# as spans. They can be written as a Chrome trace (open in chrome://tracing or https://ui.perfetto.dev)
+# and summarized as p50/p95 per stage. Untraced runs pass tracer=None and record nothing.
+
+import json
+import os
+import threading
+import time
+
+class Tracer:
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def add(self, name, start, seconds, **args):
+        # Record one completed span; start is a time.perf_counter() value, which is a system wide
+        # monotonic clock, so spans from worker processes line up with the parent's
+        event = {"name": name, "ph": "X", "ts": start * 1e6, "dur": seconds * 1e6,
+                 "pid": os.getpid(), "tid": threading.get_ident(), "args": args}
+        with self.lock:
+            self.events.append(event)
+
+    def since(self, name, start, **args):
+        # Record a span from start until now and return now, so consecutive stages can be chained
+        now = time.perf_counter()
+        self.add(name, start, now - start, **args)
+        return now
+
+    def drain(self):
+        # Remove and return the recorded events (worker processes send theirs to the parent)
+        with self.lock:
+            events = self.events
+            self.events = []
+        return events
+
+    def extend(self, events):
+        with self.lock:
+            self.events.extend(events)
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def stage_durations(self):
+        # Seconds per stage name, plus an "image total" entry summing every stage of each image
+        durations = {}
+        image_totals = {}
+        for event in self.events:
+            seconds = event["dur"] / 1e6
+            durations.setdefault(event["name"], []).append(seconds)
+            filename = event["args"].get("file")
+            if filename is not None:
+                image_totals[filename] = image_totals.get(filename, 0.0) + seconds
+        if image_totals:
+            durations["image total"] = list(image_totals.values())
+        return durations
+
+    def summary(self):
+        # One line per stage with its count, total and p50/p95/max in milliseconds
+        lines = [f"{'stage':<20} {'count':>7} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+        for name, seconds in self.stage_durations().items():
+            seconds.sort()
+            lines.append(f"{name:<20} {len(seconds):>7} {sum(seconds):>9.2f} {percentile(seconds, 50) * 1000:>9.2f} "
+                         f"{percentile(seconds, 95) * 1000:>9.2f} {seconds[-1] * 1000:>9.2f}")
+        return "\n".join(lines)
+
+def percentile(sorted_values, p):
+    # Nearest rank percentile of an already sorted, non-empty list
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
@@ -0,0 +1,119 @@
+# Tiled OCR for very large images. Instead of handing the whole image to EasyOCR, which shrinks it
+# to its canvas size (losing small text) and needs working memory that grows with the image, the
+# image is cut into overlapping tiles of a fixed size. Equally sized tiles are OCRed in batches, their
+# bboxes are shifted back to image coordinates, and text seen by two tiles in their overlap is kept once.
+
+import numpy as np
+
+DEFAULT_TILE_SIZE = 1024
+DEFAULT_TILE_OVERLAP = 128
+DEFAULT_TILE_BATCH = 8
+
+# Two detections whose boxes share this much of the smaller box are the same text seen by two tiles
+DUPLICATE_THRESHOLD = 0.5
+
+def parse_tiling(tile_size, overlap):
+    # Validate the tile settings and return them as a (tile_size, overlap) tuple
+    if tile_size < 32:
+        raise ValueError("Invalid tile size. Please provide a tile size of 32 pixels or more.")
+    if not 0 <= overlap < tile_size // 2:
+        raise ValueError("Invalid tile overlap. Please provide an overlap of 0 or more and under half the tile size.")
+    return tile_size, overlap
+
+def needs_tiling(image, tiling):
+    return tiling is not None and max(image.shape[0], image.shape[1]) > tiling[0]
+
+def tile_starts(length, tile_size, overlap):
+    # Start offsets along one axis; the last tile is pulled back so it ends at the image edge
+    if length <= tile_size:
+        return [0]
+    step = tile_size - overlap
+    starts = list(range(0, length - tile_size, step))
+    starts.append(length - tile_size)
+    return starts
+
+def tile_boxes(width, height, tile_size, overlap):
+    # (x, y, width, height) of every tile, row by row
+    return [(x, y, min(tile_size, width - x), min(tile_size, height - y))
+            for y in tile_starts(height, tile_size, overlap)
+            for x in tile_starts(width, tile_size, overlap)]
+
+def offset_bbox(bbox, x, y):
+    return [[point[0] + x, point[1] + y] for point in bbox]
+
+def box_bounds(bbox):
+    xs = [point[0] for point in bbox]
+    ys = [point[1] for point in bbox]
+    return min(xs), min(ys), max(xs), max(ys)
+
+def box_area(bounds):
+    return (bounds[2] - bounds[0]) * (bounds[3] - bounds[1])
+
+def shared_fraction(bounds1, bounds2):
+    # Intersection area over the area of the smaller box
+    width = min(bounds1[2], bounds2[2]) - max(bounds1[0], bounds2[0])
+    height = min(bounds1[3], bounds2[3]) - max(bounds1[1], bounds2[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    smaller = min(box_area(bounds1), box_area(bounds2))
+    return width * height / smaller if smaller > 0 else 0.0
+
+def tile_strip(box1, box2):
+    # Bounds of the area two tiles share, or None for tiles that don't overlap
+    left, top = max(box1[0], box2[0]), max(box1[1], box2[1])
+    right, bottom = min(box1[0] + box1[2], box2[0] + box2[2]), min(box1[1] + box1[3], box2[1] + box2[3])
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right, bottom
+
+def touches(bounds, strip):
+    return min(bounds[2], strip[2]) > max(bounds[0], strip[0]) and min(bounds[3], strip[3]) > max(bounds[1], strip[1])
+
+def deduplicate(tile_text_data, boxes):
+    # Drop detections that repeat a larger one from a neighbouring tile. A word cut by a tile border
+    # shows up whole in the neighbouring tile's overlap, so of two detections from different tiles
+    # that both reach into the tiles' shared strip and share most of their area, the larger one
+    # (then the more confident one) is kept. Detections of the same tile are never compared.
+    # tile_text_data holds the (text, confidence, bbox) detections of each tile in image coordinates;
+    # the kept detections are returned in tile order.
+    entries = [(tile, box_bounds(bbox), text, confidence, bbox)
+               for tile, text_data in enumerate(tile_text_data) for text, confidence, bbox in text_data]
+    strips = {}
+    for tile1 in range(len(boxes)):
+        for tile2 in range(len(boxes)):
+            strip = tile_strip(boxes[tile1], boxes[tile2]) if tile1 != tile2 else None
+            if strip is not None:
+                strips.setdefault(tile1, []).append((tile2, strip))
+
+    # Only detections reaching into a strip can be repeats; the rest are kept without comparisons
+    candidates = [index for index, entry in enumerate(entries)
+                  if any(touches(entry[1], strip) for _, strip in strips.get(entry[0], []))]
+    candidates.sort(key=lambda index: (-box_area(entries[index][1]), -entries[index][3]))
+    kept = {}
+    dropped = set()
+    for index in candidates:
+        tile, bounds = entries[index][0], entries[index][1]
+        for other_tile, strip in strips.get(tile, []):
+            if not touches(bounds, strip):
+                continue
+            if any(touches(entries[other][1], strip) and shared_fraction(bounds, entries[other][1]) >= DUPLICATE_THRESHOLD
+                   for other in kept.get(other_tile, [])):
+                dropped.add(index)
+                break
+        if index not in dropped:
+            kept.setdefault(tile, []).append(index)
+    return [(text, confidence, bbox) for index, (tile, bounds, text, confidence, bbox) in enumerate(entries) if index not in dropped]
+
+def read_text_tiled(read_batched, gray, tiling, tile_batch=DEFAULT_TILE_BATCH):
+    # OCR a grayscale image tile by tile. read_batched(list of images) returns text_data for each.
+    # At most tile_batch tiles are copied out and OCRed at once, so the OCR memory depends on the
+    # tile size rather than on the image size.
+    tile_size, overlap = tiling
+    boxes = tile_boxes(gray.shape[1], gray.shape[0], tile_size, overlap)
+    tile_text_data = []
+    for start in range(0, len(boxes), tile_batch):
+        batch = boxes[start:start + tile_batch]
+        tiles = [np.ascontiguousarray(gray[y:y + height, x:x + width]) for x, y, width, height in batch]
+        for (x, y, width, height), text_data in zip(batch, read_batched(tiles)):
+            tile_text_data.append([(text, confidence, offset_bbox(bbox, x, y)) for text, confidence, bbox in text_data])
+    return deduplicate(tile_text_data, boxes)